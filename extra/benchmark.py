@@ -0,0 +1,284 @@
+#! /usr/bin/python -tt
+"""benchmark - Simple timing comparisons for versionah hot paths"""
+# Copyright (C) 2011-2012  James Rowe <jnrowe@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from __future__ import print_function
+
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import versionah
+
+
+#: Registered benchmarks, mapping names to functions
+BENCHMARKS = {}
+
+
+def timed(func, *args):
+    """Time a single call of a function.
+
+    :rtype: `float`
+    :return: Wall clock time in seconds
+
+    """
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def report(name, baseline, candidate):
+    """Display a benchmark comparison.
+
+    :param str name: Benchmark name
+    :param float baseline: Time for existing implementation
+    :param float candidate: Time for new implementation
+
+    """
+    print("%-12s baseline %8.3fs  new %8.3fs  speedup %5.1fx"
+          % (name, baseline, candidate, baseline / candidate))
+
+
+def bench_dates(count=500000):
+    """Compare :func:`versionah.parse_dates` with ``strptime``."""
+    base = datetime.date(2000, 1, 1)
+    strings = []
+    for _ in range(count):
+        date = base + datetime.timedelta(days=random.randint(0, 4000))
+        if random.random() < 0.5:
+            strings.append(date.isoformat())
+        else:
+            strings.append("%02d-%s-%d" % (date.day,
+                                           versionah.MONTHS[date.month - 1],
+                                           date.year))
+
+    def strptime_path(strings):
+        parse = datetime.datetime.strptime
+        for string in strings:
+            try:
+                parse(string, "%Y-%m-%d").date()
+            except ValueError:
+                parse(string, "%d-%b-%Y").date()
+
+    def single_path(strings):
+        for string in strings:
+            versionah.parse_date(string)
+
+    baseline = timed(strptime_path, strings)
+    report("dates", baseline, timed(single_path, strings))
+    report("dates-bulk", baseline, timed(versionah.parse_dates, strings))
+BENCHMARKS["dates"] = bench_dates
+
+
+def bench_formatters(count=500000):
+    """Compare bulk formatters with per-`Version` methods."""
+    rows = [(random.randint(0, 5), random.randint(0, 20),
+             random.randint(0, 40)) for _ in range(count)]
+    versions = [versionah.Version(row) for row in rows]
+    for name in ("dotted", "hex", "libtool"):
+        method = getattr(versionah.Version, "as_%s" % name)
+        bulk = getattr(versionah, "format_%s" % name)
+        baseline = timed(lambda: [method(v) for v in versions])
+        report(name, baseline, timed(bulk, rows))
+BENCHMARKS["formatters"] = bench_formatters
+
+
+def bench_intern(count=200000, distinct=2000):
+    """Compare memory use of `Version.intern` with plain `Version` objects.
+
+    The synthetic dependency graph has ``count`` edges referencing only
+    ``distinct`` unique package versions.
+
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        print("intern       requires tracemalloc, skipping")
+        return
+    date = datetime.date(2012, 5, 11)
+    nodes = [("pkg%d" % (n % (distinct // 4)), (n % 4, n % 7, 0))
+             for n in range(distinct)]
+    edges = [random.choice(nodes) for _ in range(count)]
+
+    def measure(factory):
+        tracemalloc.start()
+        start = time.time()
+        graph = [factory(components, name, date)
+                 for name, components in edges]
+        elapsed = time.time() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del graph
+        return size, elapsed
+
+    plain_size, plain_time = measure(versionah.Version)
+    intern_size, intern_time = measure(versionah.Version.intern)
+    print("intern       plain %6.1fMiB  interned %6.1fMiB  saving %5.1f%%"
+          % (plain_size / 1048576.0, intern_size / 1048576.0,
+             100.0 * (plain_size - intern_size) / plain_size))
+    report("intern", plain_time, intern_time)
+BENCHMARKS["intern"] = bench_intern
+
+
+def bench_history(count=300000, packages=5000):
+    """Time :class:`versionah.History` queries on a large database."""
+    directory = tempfile.mkdtemp()
+    history = versionah.History(os.path.join(directory, "history.sqlite"))
+    base = datetime.date(2000, 1, 1)
+    rows = []
+    for n in range(count):
+        rows.append(("pkg%d" % (n % packages), "bump", "0.1", "0.2",
+                     (base + datetime.timedelta(days=n // 500)).isoformat(),
+                     "/tmp/pkg"))
+    with history._db:
+        history._db.executemany(
+            "INSERT INTO events (package, action, old, new, date, path) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        history._db.execute("INSERT OR REPLACE INTO latest "
+                            "SELECT package, MAX(id) FROM events "
+                            "GROUP BY package")
+    for name, query in (("package", lambda: history.package("pkg42")),
+                        ("on_date", lambda: history.on_date(base)),
+                        ("latest", history.latest)):
+        start = time.time()
+        for _ in range(10):
+            query()
+        print("history-%-8s %8.3fms per query"
+              % (name, (time.time() - start) * 100))
+    history.close()
+    shutil.rmtree(directory)
+BENCHMARKS["history"] = bench_history
+
+
+def bench_render(count=20000):
+    """Compare native rendering of built-in file types with Jinja."""
+    versions = [versionah.Version((random.randint(0, 5),
+                                   random.randint(0, 20),
+                                   random.randint(0, 40)), "pkg%d" % n)
+                for n in range(count)]
+    for file_type in sorted(versionah.NATIVE_TEMPLATES):
+        baseline = timed(lambda: [v._render_jinja("version", file_type)
+                                  for v in versions])
+        candidate = timed(lambda: [v._render_native("version", file_type)
+                                   for v in versions])
+        report("render-%s" % file_type, baseline, candidate)
+BENCHMARKS["render"] = bench_render
+
+
+def bench_construct(count=500000):
+    """Compare trusted `Version` constructors with `Version.__init__`."""
+    date = datetime.date(2012, 5, 11)
+    rows = [(random.randint(0, 5), random.randint(0, 20),
+             random.randint(0, 40)) for _ in range(count)]
+    keys = [row + (0, 3) for row in rows]
+    baseline = timed(lambda: [versionah.Version(row, "pkg", date)
+                              for row in rows])
+    unchecked = versionah.Version.from_components_unchecked
+    report("unchecked", baseline,
+           timed(lambda: [unchecked(row, "pkg", date) for row in rows]))
+    from_key = versionah.Version.from_key
+    report("from_key", baseline,
+           timed(lambda: [from_key(key, "pkg", date) for key in keys]))
+BENCHMARKS["construct"] = bench_construct
+
+
+def bench_render_cache(count=20000, distinct=200):
+    """Compare cached Jinja rendering with uncached rendering."""
+    date = datetime.date(2012, 5, 11)
+    pool = [versionah.Version((n // 100, n % 100 // 10, n % 10), "pkg", date)
+            for n in range(distinct)]
+    versions = [random.choice(pool) for _ in range(count)]
+    cache = versionah.RenderCache()
+    original = versionah.Version.render_cache
+
+    def render(render_cache):
+        versionah.Version.render_cache = render_cache
+        for version in versions:
+            version._render_jinja("version.h", "h")
+
+    baseline = timed(render, None)
+    report("render-cache", baseline, timed(render, cache))
+    print("render-cache %s" % cache.report())
+    # A new cache on a populated directory, as seen by a later run
+    directory = tempfile.mkdtemp()
+    try:
+        render(versionah.RenderCache(directory=directory))
+        cache = versionah.RenderCache(directory=directory)
+        report("render-cache-disk", baseline, timed(render, cache))
+        print("render-cache-disk %s" % cache.report())
+    finally:
+        shutil.rmtree(directory)
+        versionah.Version.render_cache = original
+BENCHMARKS["render-cache"] = bench_render_cache
+
+
+def bench_semver(count=200000):
+    """Compare sorting release-only and mixed pre-release versions."""
+    rows = [(random.randint(0, 5), random.randint(0, 20),
+             random.randint(0, 40)) for _ in range(count)]
+    releases = versionah.format_dotted(rows)
+    mixed = [string + random.choice(("", "", "-alpha", "-rc.1", "-rc.10"))
+             for string in releases]
+    baseline = timed(lambda: sorted(releases, key=versionah.sort_key))
+    report("semver-sort", baseline,
+           timed(lambda: sorted(mixed, key=versionah.sort_key)))
+BENCHMARKS["semver"] = bench_semver
+
+
+def bench_check(count=10000):
+    """Compare parallel :func:`versionah.check_files` with a single process."""
+    directory = tempfile.mkdtemp()
+    date = datetime.date(2012, 5, 11)
+    file_types = sorted(versionah.NATIVE_TEMPLATES)
+    filenames = []
+    for n in range(count):
+        file_type = file_types[n % len(file_types)]
+        filename = os.path.join(directory, "version%d.%s" % (n, file_type))
+        versionah.Version((n // 100, n % 100, 0), "pkg%d" % n,
+                          date).write(filename, file_type)
+        filenames.append(filename)
+    baseline = timed(versionah.check_files, filenames, None, 1)
+    report("check", baseline, timed(versionah.check_files, filenames))
+    shutil.rmtree(directory)
+BENCHMARKS["check"] = bench_check
+
+
+def main(argv=sys.argv[:]):
+    """Run the named benchmarks, or all of them if none are given.
+
+    :rtype: `int`
+    :return: Exit code
+
+    """
+    names = argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print("Unknown benchmark %r, choose from %s"
+                  % (name, ", ".join(sorted(BENCHMARKS))))
+            return 2
+    random.seed(42)
+    for name in names:
+        BENCHMARKS[name]()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,10 @@
 #! /usr/bin/python -tt
 
 import imp
+import os
 
 from setuptools import setup
+from setuptools.command.build_py import build_py
 
 # Hack to import _version file without importing versionah/__init__.py, its
 # purpose is to allow import without requiring dependencies at this point.
@@ -10,6 +12,21 @@ ver_file = open("versionah/_version.py")
 _version = imp.load_module("_version", ver_file, ver_file.name,
                            (".py", ver_file.mode, imp.PY_SOURCE))
 
+
+class BuildPy(build_py):
+    """Build command that also precompiles the bundled templates"""
+    def run(self):
+        build_py.run(self)
+        try:
+            import versionah
+        except ImportError:
+            print("Jinja unavailable, skipping template precompilation")
+            return
+        target = os.path.join(self.build_lib, "versionah", "compiled")
+        if not self.dry_run:
+            versionah.compile_templates(target)
+
+
 setup(
     name='versionah',
     version=_version.dotted,
@@ -50,9 +67,11 @@ setup(
     package_data={'': ['templates/*.jinja', ], },
     entry_points={'console_scripts': ['versionah = versionah:main', ]},
     zip_safe=False,
+    cmdclass={'build_py': BuildPy},
     install_requires=['Jinja2>=2', ],
     extras_require={
         'colour': ['blessings', ],
         'color': ['blessings', ],
+        'inotify': ['pyinotify', ],
     },
 )
@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import jinja2
+
+from expecter import expect
+from mock import patch
+
+from versionah import (FILTERS, CompiledLoader, RenderCache, Version,
+                       compile_templates, main)
+
+
+def test_render_cache():
+    cache = RenderCache()
+    expect(cache.get('a')) == None
+    cache.put('a', 'output')
+    expect(cache.get('a')) == 'output'
+    expect((cache.hits, cache.misses)) == (1, 1)
+    expect(cache.hit_rate) == 0.5
+    expect(cache.report()) == '1 hits, 1 misses (50.0% hit rate), ' \
+        '0 evictions, 1 entries using 6 characters'
+
+
+def test_render_cache_eviction():
+    cache = RenderCache(40)
+    for key in 'abcd':
+        cache.put(key, key * 10)
+    cache.get('a')
+    cache.put('e', 'e' * 10)
+    expect(cache.evictions) == 2
+    expect([cache.get(key) is not None for key in 'abcde']) \
+        == [True, False, False, True, True]
+
+
+def test_render_cache_oversized():
+    cache = RenderCache(4)
+    cache.put('a', 'output')
+    expect(cache.get('a')) == None
+
+
+def test_render_cache_clear():
+    cache = RenderCache()
+    cache.put('a', 'output')
+    cache.get('a')
+    cache.clear()
+    expect(cache.get('a')) == None
+    expect((cache.hits, cache.misses)) == (0, 1)
+
+
+def test_render_cache_directory():
+    tempdir = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(tempdir, 'cache')
+        RenderCache(directory=directory).put('a', 'output')
+        expect(os.listdir(directory)) == ['a']
+        cache = RenderCache(directory=directory)
+        expect(cache.get('a')) == 'output'
+        expect(cache.get('a')) == 'output'
+        expect((cache.hits, cache.disk_hits, cache.misses)) == (2, 1, 0)
+        expect(cache.report().endswith(', 1 hits from %s' % directory)) \
+            == True
+        cache.clear()
+        expect(os.listdir(directory)) == []
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_render_cache_directory_eviction():
+    tempdir = tempfile.mkdtemp()
+    try:
+        cache = RenderCache(40, tempdir)
+        for n, key in enumerate('abcd'):
+            cache.put(key, key * 10)
+            os.utime(os.path.join(tempdir, key), (n, n))
+        # Reading touches an entry, so 'a' becomes the most recently used
+        RenderCache(directory=tempdir).get('a')
+        cache.put('e', 'e' * 10)
+        expect(sorted(os.listdir(tempdir))) == ['a', 'd', 'e']
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_render_cache_directory_unwritable():
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'file')
+        open(filename, 'w').close()
+        cache = RenderCache(directory=os.path.join(filename, 'cache'))
+        cache.put('a', 'output')
+        expect(cache.get('a')) == 'output'
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def render_with(templates, version, file_type, cache):
+    tempdir = tempfile.mkdtemp()
+    try:
+        for name, source in templates.items():
+            open(os.path.join(tempdir, name), 'w').write(source)
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(tempdir))
+        env.filters.update(FILTERS)
+        with patch.object(Version, 'env', env):
+            with patch.object(Version, 'render_cache', cache):
+                return [version._render_jinja('version', file_type)
+                        for _ in range(3)]
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_render_jinja_cached():
+    cache = RenderCache()
+    v = Version((0, 1, 0), 'test', date(2012, 5, 11))
+    output = render_with({'web.jinja': '{{ web }}'}, v, 'web', cache)
+    expect(output) == ['test/0.1.0'] * 3
+    expect((cache.hits, cache.misses)) == (2, 1)
+    # Unreferenced fields don't change the key
+    v.date = date(2012, 5, 12)
+    render_with({'web.jinja': '{{ web }}'}, v, 'web', cache)
+    expect((cache.hits, cache.misses)) == (5, 1)
+    # Changed sources do
+    render_with({'web.jinja': '{{ web }}\n'}, v, 'web', cache)
+    expect((cache.hits, cache.misses)) == (7, 2)
+
+
+def test_render_jinja_uncached():
+    v = Version((0, 1, 0), 'test', date(2012, 5, 11))
+    for templates in ({'now.jinja': '{{ now }}'},
+                      {'now.jinja': '{% include "base.jinja" %}',
+                       'base.jinja': '{{ dotted }}'}):
+        cache = RenderCache()
+        render_with(templates, v, 'now', cache)
+        expect((cache.hits, cache.misses)) == (0, 0)
+
+
+def test_render_jinja_disabled():
+    v = Version((0, 1, 0), 'test', date(2012, 5, 11))
+    expect(render_with({'web.jinja': '{{ web }}'}, v, 'web', None)) \
+        == ['test/0.1.0'] * 3
+
+
+def test_render_jinja_compiled():
+    tempdir = tempfile.mkdtemp()
+    try:
+        compile_templates(tempdir)
+        env = jinja2.Environment(loader=jinja2.ChoiceLoader(
+            [CompiledLoader(tempdir),
+             jinja2.DictLoader({'web.jinja': '{{ web }}'})]))
+        env.filters.update(FILTERS)
+        cache = RenderCache()
+        v = Version((0, 1, 0), 'test', date(2012, 5, 11))
+        with patch.object(Version, 'env', env):
+            with patch.object(Version, 'render_cache', cache):
+                for file_type in ('web', 'h', 'h'):
+                    v._render_jinja('version', file_type)
+        expect((cache.hits, cache.misses)) == (1, 2)
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_render_jinja_no_source():
+    tempdir = tempfile.mkdtemp()
+    try:
+        compile_templates(tempdir)
+        env = jinja2.Environment(loader=jinja2.ModuleLoader(tempdir))
+        env.filters.update(FILTERS)
+        cache = RenderCache()
+        v = Version((0, 1, 0), 'test', date(2012, 5, 11))
+        with patch.object(Version, 'env', env):
+            with patch.object(Version, 'render_cache', cache):
+                v._render_jinja('version', 'h')
+        expect((cache.hits, cache.misses)) == (0, 0)
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_main_cache_stats():
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'VERSION')
+        Version((0, 1, 0), 'test', date(2012, 5, 11)).write(filename, 'text')
+        with patch('sys.stderr', new_callable=StringIO) as stderr:
+            with patch('sys.stdout', new_callable=StringIO):
+                main(['versionah', '--cache-stats', filename])
+        expect(stderr.getvalue().startswith('Render cache: ')) == True
+    finally:
+        shutil.rmtree(tempdir)
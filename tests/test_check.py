@@ -0,0 +1,170 @@
+import errno
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from datetime import date
+
+from expecter import expect
+from mock import patch
+from nose2.tools import params
+
+from versionah import (Version, Workspace, check_file, check_files,
+                       check_output, check_workspace, main)
+
+
+TEMPDIR = None
+VERSION = Version((1, 2, 3), 'test', date(2012, 5, 11))
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def write(name, data):
+    filename = os.path.join(TEMPDIR, name)
+    open(filename, 'w').write(data)
+    return filename
+
+
+@params('c', 'h', 'json', 'm4', 'py', 'rb', 'text')
+def test_check_valid(file_type):
+    filename = os.path.join(TEMPDIR, 'valid.%s' % file_type)
+    VERSION.write(filename, file_type)
+    result = check_file(filename, file_type)
+    expect(result['errors']) == []
+    expect(result['version']) == '1.2.3'
+
+
+@params(
+    ('This is 9test version 1.0 (2012-05-11)',
+     ["Invalid package name string '9test'"]),
+    ('This is test version 1.x (2012-05-11)',
+     ["Invalid version string '1.x'"]),
+    ('This is test version 1.0 (2012-02-30)',
+     ["Invalid date string '2012-02-30'"]),
+    ('This is test version 1.0 (2999-01-01)',
+     ['Date 2999-01-01 is in the future']),
+    ('version 1.0', ['No version identifier found']),
+)
+def test_check_invalid(data, errors):
+    result = check_file(write('invalid.txt', data))
+    expect(result['errors']) == errors
+    expect(result['version']) == None
+
+
+def test_check_out_of_sync():
+    filename = os.path.join(TEMPDIR, 'sync.h')
+    VERSION.write(filename, 'h')
+    data = open(filename).read()
+    write('sync.h', data.replace('0x010203', '0x010204'))
+    expect(check_file(filename)['errors']) \
+        == ['Content out of sync with test/1.2.3']
+
+
+def test_check_missing():
+    result = check_file(os.path.join(TEMPDIR, 'missing'))
+    expect(result['errors']) \
+        == ['Unable to read file: No such file or directory']
+
+
+def test_check_files_order():
+    filenames = []
+    for n in range(10):
+        filename = os.path.join(TEMPDIR, 'order%d.txt' % n)
+        if n % 3:
+            Version((n, 0), 'test', date(2012, 5, 11)).write(filename, 'text')
+        else:
+            write(filename, '')
+        filenames.append(filename)
+    for processes in (1, 2):
+        results = check_files(filenames, processes=processes, batch_files=3)
+        expect([r['file'] for r in results]) == filenames
+        expect([r['version'] for r in results]) \
+            == [None if n % 3 == 0 else '%d.0' % n for n in range(10)]
+
+
+def test_main_check():
+    valid = os.path.join(TEMPDIR, 'main.txt')
+    VERSION.write(valid, 'text')
+    invalid = write('main-invalid.txt', '')
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--check', valid])) == None
+        report = json.loads(stdout.getvalue())
+        expect((report['checked'], report['failed'])) == (1, 0)
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--check', valid, invalid])) \
+            == errno.EINVAL
+        report = json.loads(stdout.getvalue())
+        expect((report['checked'], report['failed'])) == (2, 1)
+
+
+def test_check_output():
+    source = os.path.join(TEMPDIR, 'output.txt')
+    VERSION.write(source, 'text')
+    output = os.path.join(TEMPDIR, 'output.h')
+    VERSION.write(output, 'h')
+    result = check_output(output, 'h', source)
+    expect(result['errors']) == []
+    expect(result['source']) == source
+    Version((1, 2, 4), 'test', date(2012, 5, 11)).write(source, 'text')
+    expect(check_output(output, 'h', source)['errors']) \
+        == ['Output out of sync with %s' % source]
+
+
+def test_check_output_missing_source():
+    result = check_output(os.path.join(TEMPDIR, 'output.h'), 'h',
+                          os.path.join(TEMPDIR, 'missing'))
+    expect(result['errors']) \
+        == ['Unable to read source: No such file or directory']
+
+
+def workspace(name):
+    base = os.path.join(TEMPDIR, name)
+    os.mkdir(base)
+    VERSION.write(os.path.join(base, 'VERSION'), 'text')
+    VERSION.write(os.path.join(base, 'version.h'), 'h')
+    VERSION.write(os.path.join(base, 'version.py'), 'py')
+    manifest = os.path.join(base, 'versionah.ini')
+    open(manifest, 'w').write('[test]\nfile = VERSION\n'
+                              'outputs = version.h version.py\n')
+    return manifest
+
+
+def test_check_workspace():
+    manifest = workspace('check-workspace')
+    base = os.path.dirname(manifest)
+    results = check_workspace(Workspace.read(manifest), processes=1)
+    expect([(r['file'], r['errors']) for r in results]) \
+        == [(os.path.join(base, f), [])
+            for f in ('VERSION', 'version.h', 'version.py')]
+    Version((1, 3), 'test', date(2012, 5, 11)).write(
+        os.path.join(base, 'VERSION'), 'text')
+    results = check_workspace(Workspace.read(manifest), processes=1)
+    expect([len(r['errors']) for r in results]) == [0, 1, 1]
+
+
+def test_main_check_workspace():
+    manifest = workspace('main-workspace')
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--check', '--workspace', manifest])) \
+            == None
+        report = json.loads(stdout.getvalue())
+        expect((report['checked'], report['failed'])) == (3, 0)
+    write(os.path.join('main-workspace', 'version.h'), '')
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--check', '--workspace', manifest])) \
+            == errno.EINVAL
+        report = json.loads(stdout.getvalue())
+        expect((report['checked'], report['failed'])) == (3, 1)
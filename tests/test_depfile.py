@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (Version, escape_make, main)
+
+
+@params(
+    ('version.h', 'version.h'),
+    ('my version.h', 'my\\ version.h'),
+    ('$HOME/#1', '$$HOME/\\#1'),
+)
+def test_escape_make(path, expected):
+    expect(escape_make(path)) == expected
+
+
+def test_template_path():
+    path = os.path.join('versionah', 'templates', 'h.jinja')
+    expect(Version.template_path('h').endswith(path)) == True
+
+
+def test_main_depfile():
+    tempdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tempdir, 'VERSION')
+        header = os.path.join(tempdir, 'version.h')
+        depfile = os.path.join(tempdir, 'version.d')
+        open(source, 'w').write('This is test version 0.1.0 (2012-05-11)')
+        main(['versionah', '-o', header, '-M', depfile, source])
+        expect(open(depfile).read()) \
+            == '%s: %s %s\n' % (header, Version.template_path('h'), source)
+    finally:
+        shutil.rmtree(tempdir)
@@ -1,8 +1,11 @@
+import os
+
 from expecter import expect
 from mock import (Mock, patch)
 from nose2.tools import params
 
-from versionah import (Version, process_command_line)
+from versionah import (Version, VersionRegistry, parse_date, parse_output,
+                       process_command_line)
 
 from utils import raises_OSError
 
@@ -97,3 +100,110 @@ def test_process_command_line_no_file():
 def test_process_command_line_multiple_file():
     with expect.raises_OSError(2, 'Only one version file must be specified'):
         process_command_line(['test1', 'test2'])
+
+
+@params(
+    ('2011-13-01', ),
+    ('02-Foo-2011', ),
+    ('2011/02/19', ),
+)
+def test_parse_date_invalid(string):
+    with expect.raises(ValueError, 'Invalid date string %r' % string):
+        parse_date(string)
+
+
+def test_parse_output_invalid_type():
+    with expect.raises(ValueError,
+                       "Invalid file type 'pdf' for output 'version'"):
+        parse_output('version:pdf')
+
+
+def test_process_command_line_watch_no_outputs():
+    with expect.raises_OSError(2, 'Watch mode requires at least one output'):
+        process_command_line(['--watch', 'test'])
+
+
+def test_version_intern_immutable():
+    v = Version.intern((0, 1, 0))
+    with expect.raises(AttributeError,
+                       'Interned Version objects are immutable'):
+        v.bump('minor')
+    expect(v.components) == (0, 1, 0)
+
+
+def test_version_registry_invalid():
+    with expect.raises(ValueError, "Invalid registry file 'setup.py'"):
+        VersionRegistry('setup.py')
+
+
+def test_version_registry_unstorable():
+    with expect.raises(ValueError,
+                       'Unable to store test 4294967296.0 in registry'):
+        VersionRegistry.write(os.devnull, [Version((2 ** 32, 0), 'test')])
+
+
+def test_process_command_line_invalid_display_format():
+    with expect.raises_OSError(2, "Unknown display format 'foo'"):
+        process_command_line(['--display=foo', 'test'])
+
+
+def test_process_command_line_invalid_file_type():
+    with expect.raises_OSError(2, "Invalid file type 'foo'"):
+        process_command_line(['--type=foo', 'test'])
+
+
+def test_process_command_line_anchor_without_patch():
+    with expect.raises_OSError(2, 'Anchors require patch mode'):
+        process_command_line(['--anchor=version', 'test'])
+
+
+def test_process_command_line_invalid_anchor():
+    with expect.raises_OSError(2, "Invalid anchor '('"):
+        process_command_line(['--patch', '--anchor=(', 'test'])
+
+
+def test_process_command_line_workspace_without_bump():
+    with expect.raises_OSError(2, 'Workspaces require a bump'):
+        process_command_line(['--workspace=versionah.ini', 'pkg'])
+
+
+def test_process_command_line_check_without_files():
+    with expect.raises_OSError(2, 'One version file must be specified'):
+        process_command_line(['--check'])
+
+
+def test_process_command_line_check_workspace_with_files():
+    with expect.raises_OSError(2, "Workspace checks don't take files"):
+        process_command_line(['--check', '--workspace=versionah.ini', 'pkg'])
+
+
+def test_process_command_line_invalid_jobs():
+    with expect.raises_OSError(2, 'Invalid number of jobs 0'):
+        process_command_line(['--sort', '-j', '0'])
+
+
+@params(
+    (['--bump', 'minor'], ),
+    (['--set', '1.0.0'], ),
+    (['--name', 'test'], ),
+    (['-o', 'version.h'], ),
+)
+def test_process_command_line_check_modifications(args):
+    with expect.raises_OSError(2, "Check mode doesn't modify files"):
+        process_command_line(['--check'] + args + ['test'])
+
+
+@params(
+    (['--name', 'test'], ),
+    (['-o', 'version.h'], ),
+)
+def test_process_command_line_transaction_unsupported(args):
+    with expect.raises_OSError(2, "Transactions can't change names or write "
+                                  "outputs"):
+        process_command_line(['-x', '-b', 'minor'] + args + ['a', 'b'])
+
+
+def test_process_command_line_workspace_expect():
+    with expect.raises_OSError(2, "Workspaces can't check expected versions"):
+        process_command_line(['--workspace=versionah.ini', '-b', 'minor',
+                              '--expect', '0.1.0', 'pkg'])
@@ -0,0 +1,77 @@
+import pickle
+from datetime import date
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (FrozenVersion, Version, sort_key)
+
+
+def test_freeze_thaw():
+    v = Version((0, 1), 'test', date(2012, 5, 11))
+    frozen = v.freeze()
+    expect(repr(frozen)) == "FrozenVersion((0, 1), 'test', %r)" \
+        % date(2012, 5, 11)
+    expect(repr(frozen.thaw())) == repr(v)
+
+
+def test_frozen_immutable():
+    frozen = FrozenVersion()
+    with expect.raises(AttributeError):
+        frozen.name = 'test'
+    with expect.raises(AttributeError):
+        frozen.extra = True
+
+
+def test_frozen_thaw_copies():
+    frozen = FrozenVersion((0, 1, 0))
+    v = frozen.thaw()
+    v.bump('minor')
+    expect(frozen.components) == (0, 1, 0)
+
+
+@params(
+    ((0, 1), ),
+    ((0, 1, 0), ),
+    ('0.1.0.0', ),
+)
+def test_frozen_dict_key(components):
+    index = {FrozenVersion((0, 1, 0)): 'found'}
+    expect(index[FrozenVersion(components)]) == 'found'
+
+
+@params(
+    Version((0, 1, 0)),
+    FrozenVersion((0, 1)),
+    ((0, 1, 0, 0), ),
+    '0.1',
+)
+def test_frozen_cmp(other):
+    expect(FrozenVersion((0, 1, 0))) == other
+    expect(FrozenVersion((0, 0, 9))) < other
+    expect(FrozenVersion((0, 1, 1))) > other
+
+
+def test_version_cmp_frozen():
+    expect(Version((0, 1, 0))) == FrozenVersion((0, 1))
+    expect(Version((0, 2, 0))) > FrozenVersion((0, 1))
+
+
+def test_frozen_pickle():
+    frozen = FrozenVersion((1, 2, 3), 'test', date(2012, 5, 11))
+    expect(repr(pickle.loads(pickle.dumps(frozen)))) == repr(frozen)
+
+
+def test_frozen_sort_key():
+    versions = [FrozenVersion('1.0'), Version((0, 2)), '0.3']
+    expect([str(v) for v in sorted(versions, key=sort_key)]) \
+        == ['unknown v0.2', '0.3', 'unknown v1.0']
+
+
+def test_frozen_semver():
+    frozen = Version('1.0.0-rc.1+build.5', 'test', date(2012, 5, 11)).freeze()
+    expect(frozen.as_dotted()) == '1.0.0-rc.1+build.5'
+    expect(frozen < FrozenVersion('1.0.0')) == True
+    expect(frozen == FrozenVersion('1.0.0-rc.1+build.6')) == True
+    expect(hash(frozen)) == hash(FrozenVersion('1.0.0-rc.1'))
+    expect(frozen.thaw().prerelease) == ('rc', '1')
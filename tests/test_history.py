@@ -0,0 +1,70 @@
+import errno
+import os
+import shutil
+import tempfile
+
+from datetime import date
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from expecter import expect
+from mock import patch
+
+from versionah import (History, Version, main)
+
+
+TEMPDIR = None
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def make_history(name):
+    history = History(os.path.join(TEMPDIR, name))
+    history.record('set', 'a', None, Version((0, 1), 'foo', date(2012, 1, 1)))
+    history.record('bump', 'a', Version((0, 1), 'foo', date(2012, 1, 1)),
+                   Version((0, 2), 'foo', date(2012, 5, 11)))
+    history.record('set', 'b', None, Version((1, 0), 'bar', date(2012, 5, 11)))
+    return history
+
+
+def test_history_package():
+    history = make_history('package')
+    path = os.path.abspath('a')
+    expect(history.package('foo')) \
+        == [('foo', 'set', None, '0.1', '2012-01-01', path),
+            ('foo', 'bump', '0.1', '0.2', '2012-05-11', path)]
+    expect(history.package('baz')) == []
+    history.close()
+
+
+def test_history_on_date():
+    history = make_history('on_date')
+    expect([event[:4] for event in history.on_date(date(2012, 5, 11))]) \
+        == [('foo', 'bump', '0.1', '0.2'), ('bar', 'set', None, '1.0')]
+    history.close()
+
+
+def test_history_latest():
+    history = make_history('latest')
+    expect([event[:4] for event in history.latest()]) \
+        == [('foo', 'bump', '0.1', '0.2'), ('bar', 'set', None, '1.0')]
+    history.close()
+
+
+def test_main_history_invalid_date():
+    make_history('invalid_date').close()
+    filename = os.path.join(TEMPDIR, 'invalid_date')
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--history-file', filename, '--history',
+                     '2012-13-45'])) == errno.EINVAL
+    expect(stdout.getvalue()) == "Invalid date string '2012-13-45'\n"
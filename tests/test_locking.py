@@ -0,0 +1,51 @@
+import errno
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from expecter import expect
+
+from versionah import (Version, fcntl, main)
+
+
+def bump_repeatedly(filename, count):
+    """Bump a file's micro component from a separate process"""
+    sys.stdout = open(os.devnull, 'w')
+    for _ in range(count):
+        main(['versionah', '--bump', 'micro', filename])
+
+
+def test_concurrent_bumps():
+    if not fcntl:
+        return
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'VERSION')
+        open(filename, 'w').write('This is test version 0.1.0 (2012-05-11)')
+        workers = [multiprocessing.Process(target=bump_repeatedly,
+                                           args=(filename, 10))
+                   for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        expect(Version.read(filename).components) == (0, 1, 80)
+        expect(os.listdir(tempdir)) == ['VERSION']
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_expect_mismatch():
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'VERSION')
+        open(filename, 'w').write('This is test version 0.1.1 (2012-05-11)')
+        expect(main(['versionah', '--bump', 'micro', '--expect', '0.1.0',
+                     filename])) == errno.EAGAIN
+        expect(Version.read(filename).components) == (0, 1, 1)
+        main(['versionah', '--bump', 'micro', '--expect', '0.1.1', filename])
+        expect(Version.read(filename).components) == (0, 1, 2)
+    finally:
+        shutil.rmtree(tempdir)
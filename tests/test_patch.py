@@ -0,0 +1,144 @@
+import datetime
+import errno
+import os
+import shutil
+import tempfile
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (PATCH_BLOCK, History, compile_anchor, find_spans, main,
+                       patch_file)
+
+
+SETUP_PY = """from setuptools import setup
+
+# This is test version 0.1.0 (2012-05-11)
+setup(
+    name='test',
+    version='0.1.0',
+)
+"""
+
+TEMPDIR = None
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def write(name, data):
+    filename = os.path.join(TEMPDIR, name)
+    open(filename, 'w').write(data)
+    return filename
+
+
+def test_find_spans():
+    version, spans = find_spans(SETUP_PY.encode('ascii'),
+                                [compile_anchor("version='(.*?)'")])
+    expect(version.components) == (0, 1, 0)
+    expect(version.name) == 'test'
+    expect(version.date) == datetime.date(2012, 5, 11)
+    expect([field for _, _, field in spans]) \
+        == ['name', 'dotted', 'date', 'dotted']
+
+
+def test_find_spans_overlapping():
+    data = b'This is test version 0.1.0 (2012-05-11)'
+    _, spans = find_spans(data, [compile_anchor(r'\d+\.\d+\.\d+')])
+    expect(len(spans)) == 3
+
+
+def test_find_spans_none():
+    expect(find_spans(b'no version here')) == (None, [])
+
+
+def test_patch_in_place():
+    filename = write('setup.py', SETUP_PY)
+    inode = os.stat(filename).st_ino
+    version = patch_file(filename, [compile_anchor("version='(.*?)'")],
+                         'micro')
+    expect(version.components) == (0, 1, 1)
+    expect(os.stat(filename).st_ino) == inode
+    date = datetime.date.today().isoformat()
+    expect(open(filename).read()) \
+        == SETUP_PY.replace('0.1.0', '0.1.1').replace('2012-05-11', date)
+
+
+def test_patch_resized():
+    filename = write('resized.py', SETUP_PY)
+    os.chmod(filename, 0o751)
+    patch_file(filename, [compile_anchor("version='(.*?)'")],
+               components=(10, 0, 0), name='renamed')
+    expect(open(filename).read()) \
+        == SETUP_PY.replace('0.1.0', '10.0.0').replace('is test', 'is renamed')
+    expect(os.stat(filename).st_mode & 0o777) == 0o751
+    expect([s for s in os.listdir(TEMPDIR)
+            if s.startswith('.versionah-')]) == []
+
+
+def test_patch_resized_links():
+    real = write('real.py', SETUP_PY)
+    hard = os.path.join(TEMPDIR, 'hard.py')
+    link = os.path.join(TEMPDIR, 'link.py')
+    os.link(real, hard)
+    os.symlink('real.py', link)
+    patch_file(link, [compile_anchor("version='(.*?)'")],
+               components=(0, 10, 0))
+    expect(os.path.islink(link)) == True
+    expect(os.path.samefile(real, hard)) == True
+    expect(open(hard).read()) == SETUP_PY.replace('0.1.0', '0.10.0')
+
+
+def test_patch_resized_large():
+    padding = 'x' * (PATCH_BLOCK * 3 + 7) + '\n'
+    data = padding + "VERSION = '9.9'\n" + padding
+    filename = write('big.py', data)
+    patch_file(filename, [compile_anchor("VERSION = '(.*?)'")], 'major')
+    expect(open(filename).read()) == data.replace('9.9', '10.0')
+
+
+@params(
+    'empty',
+    'no version here\n',
+)
+def test_patch_no_spans(data):
+    filename = write('invalid.py', '' if data == 'empty' else data)
+    with expect.raises(ValueError):
+        patch_file(filename, [compile_anchor("version='(.*?)'")], 'minor')
+
+
+def test_main_patch():
+    filename = write('package.json', '{\n  "version": "1.2.3"\n}\n')
+    main(['versionah', '--patch', '-a', '"version": "(.*?)"', '-b', 'minor',
+          filename])
+    expect(open(filename).read()) == '{\n  "version": "1.3.0"\n}\n'
+
+
+def test_main_patch_expect():
+    filename = write('expect.py', SETUP_PY)
+    expect(main(['versionah', '--patch', '--expect', '9.9.9', '-b', 'micro',
+                 filename])) == errno.EAGAIN
+    expect(open(filename).read()) == SETUP_PY
+    expect(main(['versionah', '--patch', '--expect', '0.1.0', '-b', 'micro',
+                 filename])) == None
+    expect(find_spans(open(filename, 'rb').read(), [])[0].components) \
+        == (0, 1, 1)
+
+
+def test_main_patch_history():
+    filename = write('history.py', SETUP_PY)
+    history_file = os.path.join(TEMPDIR, 'history.sqlite')
+    main(['versionah', '--patch', '--history-file', history_file, '-b',
+          'minor', filename])
+    history = History(history_file)
+    try:
+        events = history.package('test')
+    finally:
+        history.close()
+    expect([event[1:4] for event in events]) == [('bump', '0.1.0', '0.2.0')]
@@ -0,0 +1,66 @@
+import datetime
+
+from expecter import expect
+from mock import patch
+
+import versionah
+
+from versionah import (FILETYPE_ENTRY_POINT, FORMAT_ENTRY_POINT, FORMATS,
+                       Version, get_formatter, guess_type, is_filetype)
+
+
+class FakeEntryPoint(object):
+    def __init__(self, name, obj):
+        self.name = name
+        self.obj = obj
+        self.loaded = 0
+
+    def load(self):
+        self.loaded += 1
+        return self.obj
+
+
+def make_entry_points():
+    return {
+        FORMAT_ENTRY_POINT: {
+            'rpm': FakeEntryPoint('rpm', lambda v: '%s-%s' % (v.name,
+                                                              v.as_dotted())),
+        },
+        FILETYPE_ENTRY_POINT: {
+            'sh': FakeEntryPoint('sh', lambda: 'VERSION="{{ dotted }}"'),
+        },
+    }
+
+
+def test_custom_format():
+    FORMATS['upper'] = lambda v: v.name.upper()
+    try:
+        expect(Version(name='test').display('upper')) == 'TEST'
+        expect('upper' in Version.display_types()) == True
+    finally:
+        del FORMATS['upper']
+
+
+def test_plugin_format_lazy():
+    entry_points = make_entry_points()
+    with patch.dict(versionah._ENTRY_POINTS, entry_points):
+        point = entry_points[FORMAT_ENTRY_POINT]['rpm']
+        v = Version((1, 2), 'test')
+        expect(v.display('dotted')) == '1.2'
+        expect(point.loaded) == 0
+        expect('rpm' in Version.display_types()) == True
+        expect(point.loaded) == 0
+        try:
+            expect(v.display('rpm')) == 'test-1.2'
+            expect(get_formatter('rpm')(v)) == 'test-1.2'
+            expect(point.loaded) == 1
+        finally:
+            del FORMATS['rpm']
+
+
+def test_plugin_filetype():
+    with patch.dict(versionah._ENTRY_POINTS, make_entry_points()):
+        expect(is_filetype('sh')) == True
+        expect(guess_type('version.sh')) == 'sh'
+        v = Version((1, 2), 'test', datetime.date(2012, 5, 11))
+        expect(v.render('sh', 'version.sh')) == 'VERSION="1.2"'
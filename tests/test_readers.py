@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (Version, read_json, read_py)
+
+
+TEMPDIR = None
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def test_read_json():
+    data = json.dumps({'dotted': '0.1.0', 'date': '2012-05-11',
+                       'web': 'test/0.1.0'})
+    expect(read_json(data)) == ('test', '0.1.0', '2012-05-11')
+
+
+@params(
+    '',
+    '[]',
+    '{"dotted": "0.1.0"}',
+    '{"dotted": "0.1.0", "date": "2012-05-11", "web": "0.1.0"}',
+    '{"dotted": 1, "date": "2012-05-11", "web": "test/0.1.0"}',
+)
+def test_read_json_invalid(data):
+    expect(read_json(data)) == None
+
+
+def test_read_py():
+    data = "dotted = '0.1.0'\ndate='2012-05-11'\nweb = \"test/0.1.0\"\n"
+    expect(read_py(data)) == ('test', '0.1.0', '2012-05-11')
+
+
+@params(
+    '',
+    'dotted = "0.1.0"\ndate = "2012-05-11"\n',
+    'dotted = "0.1.0\'\ndate = "2012-05-11"\nweb = "test/0.1.0"\n',
+)
+def test_read_py_invalid(data):
+    expect(read_py(data)) == None
+
+
+@params('json', 'py')
+def test_read_without_magic(file_type):
+    filename = os.path.join(TEMPDIR, 'version.%s' % file_type)
+    Version((1, 2), 'test', date(2012, 5, 11)).write(filename, file_type)
+    lines = open(filename).read().splitlines()
+    open(filename, 'w').write('\n'.join(line for line in lines
+                                         if 'This is' not in line))
+    version = Version.read(filename)
+    expect(version.components) == (1, 2)
+    expect(version.name) == 'test'
+    expect(version.date) == date(2012, 5, 11)
+
+
+def test_read_fallback():
+    filename = os.path.join(TEMPDIR, 'fallback.json')
+    open(filename, 'w').write('This is test version 0.2.0 (2011-02-19)')
+    expect(Version.read(filename).components) == (0, 2, 0)
+
+
+def test_read_file_type():
+    filename = os.path.join(TEMPDIR, 'version.txt')
+    open(filename, 'w').write('web = "test/3.0"\ndotted = "3.0"\n'
+                              'date = "2012-05-11"\n')
+    expect(Version.read(filename, 'py').components) == (3, 0)
+    with expect.raises(ValueError):
+        Version.read(filename)
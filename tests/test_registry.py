@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+from datetime import date
+
+from expecter import expect
+
+from versionah import (Version, VersionRegistry)
+
+
+TEMPDIR = None
+VERSIONS = [
+    Version((1, 0), 'foo', date(2012, 5, 11)),
+    Version((0, 1, 0), 'bar', date(1969, 12, 31)),
+    Version((0, 9, 1, 4), 'foo', date(2011, 2, 19)),
+    Version((4294967295, 0), 'baz', date(2011, 2, 19)),
+]
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def test_registry_roundtrip():
+    filename = os.path.join(TEMPDIR, 'roundtrip')
+    VersionRegistry.write(filename, VERSIONS)
+    with VersionRegistry(filename) as registry:
+        expect(len(registry)) == 4
+        expect([repr(v) for v in registry]) \
+            == [repr(VERSIONS[i]) for i in (1, 3, 2, 0)]
+        expect(repr(registry[-1])) == repr(VERSIONS[0])
+        with expect.raises(IndexError):
+            registry[4]
+
+
+def test_registry_find():
+    filename = os.path.join(TEMPDIR, 'find')
+    VersionRegistry.write(filename, VERSIONS)
+    with VersionRegistry(filename) as registry:
+        expect([v.components for v in registry.find('foo')]) \
+            == [(0, 9, 1, 4), (1, 0)]
+        expect(registry.find('bar')[0].date) == date(1969, 12, 31)
+        expect(registry.find('quux')) == []
+
+
+def test_registry_build():
+    filename = os.path.join(TEMPDIR, 'build')
+    VersionRegistry.build(filename, ['tests/data/test_a',
+                                     'tests/data/shtool/test.txt'])
+    with VersionRegistry(filename) as registry:
+        expect([str(v) for v in registry]) \
+            == ['shtool_output_test v1.2.3', 'test v0.1.0']
+
+
+def test_registry_empty():
+    filename = os.path.join(TEMPDIR, 'empty')
+    VersionRegistry.write(filename, [])
+    with VersionRegistry(filename) as registry:
+        expect(len(registry)) == 0
+        expect(registry.find('foo')) == []
+
+
+def test_registry_semver():
+    filename = os.path.join(TEMPDIR, 'semver')
+    with expect.raises(ValueError):
+        VersionRegistry.write(filename, [Version('1.0.0-rc.1', 'foo')])
+
+
+def test_registry_invalid():
+    filename = os.path.join(TEMPDIR, 'invalid')
+    VersionRegistry.write(filename, VERSIONS)
+    data = open(filename, 'rb').read()
+    for size in (0, 8, VersionRegistry.HEADER.size + 4):
+        open(filename, 'wb').write(data[:size])
+        with expect.raises(ValueError):
+            VersionRegistry(filename)
@@ -0,0 +1,84 @@
+import errno
+import os
+import shutil
+import tempfile
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from expecter import expect
+from mock import patch
+from nose2.tools import params
+
+from versionah import (main, sort_key, sort_versions)
+
+
+INPUT = '1.0\n0.1.0\n0.10\n0.2\n\n0.1\n2.0.0.1\n0.9.9\n'
+
+
+@params(
+    ('0.1', (0, 1, 0, 0, 1)),
+    ('1.2.3.4', (1, 2, 3, 4, 1)),
+    ('1.0.0-rc.1', (1, 0, 0, 0, 0, (1, 'rc'), (0, 1))),
+)
+def test_sort_key(string, expected):
+    expect(sort_key(string)) == expected
+
+
+def test_sort_key_reverse():
+    expect(sort_key('1.2.3', reverse=True)) == (-1, -2, -3, 0, -1)
+
+
+# Precedence order from the SemVer specification
+SEMVER = ['1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta',
+          '1.0.0-beta.2', '1.0.0-beta.11', '1.0.0-rc.1', '1.0.0', '1.0.1-0',
+          '1.0.1-a', '1.0.1-aa', '1.0.1-b', '1.0.1']
+
+
+def test_sort_key_semver():
+    shuffled = SEMVER[::-1]
+    shuffled.insert(3, shuffled.pop())
+    expect(sorted(shuffled, key=sort_key)) == SEMVER
+    expect(sorted(shuffled, key=lambda s: sort_key(s, reverse=True))) \
+        == SEMVER[::-1]
+
+
+def test_sort_key_build_metadata():
+    expect(sort_key('1.0.0+build.5')) == sort_key('1.0.0')
+
+
+@params(
+    (False, False, ['0.1', '0.1.0', '0.2', '0.9.9', '0.10', '1.0',
+                    '2.0.0.1']),
+    (True, False, ['0.1', '0.2', '0.9.9', '0.10', '1.0', '2.0.0.1']),
+    (False, True, ['2.0.0.1', '1.0', '0.10', '0.9.9', '0.2', '0.1',
+                   '0.1.0']),
+    (True, True, ['2.0.0.1', '1.0', '0.10', '0.9.9', '0.2', '0.1']),
+)
+def test_sort_versions(unique, reverse, expected):
+    for processes in (1, 2):
+        output = StringIO()
+        sort_versions([StringIO(INPUT), ], output, unique, reverse,
+                      chunk_lines=2, processes=processes, fan_in=2)
+        expect(output.getvalue().splitlines()) == expected
+
+
+def test_main_sort_missing():
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'versions')
+        open(filename, 'w').write('0.2\n0.1\n')
+        missing = os.path.join(tempdir, 'missing')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            expect(main(['versionah', '--sort', filename, missing])) \
+                == errno.ENOENT
+        expect(stdout.getvalue()) \
+            == "Unable to open %r: No such file or directory\n" % missing
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            expect(main(['versionah', '--sort', '-j', '1', filename])) \
+                == None
+        expect(stdout.getvalue()) == '0.1\n0.2\n'
+    finally:
+        shutil.rmtree(tempdir)
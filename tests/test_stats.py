@@ -0,0 +1,75 @@
+import errno
+import os
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from expecter import expect
+from mock import patch
+
+from versionah import (InventoryStats, inventory_stats, main)
+
+
+RECORDS = '''foo 0.1.0
+bar 1.0 2011-02-19
+foo 0.10.0
+foo 0.2
+
+bar 1.0.1
+baz 2.0.0.1
+invalid
+bar 1.x
+'''
+
+
+def test_inventory_stats():
+    for processes in (1, 2):
+        stats = inventory_stats([StringIO(RECORDS), ], processes,
+                                batch_lines=2)
+        expect(stats.records) == 6
+        expect(stats.invalid) == 2
+        expect(stats.packages['foo']) \
+            == [3, (0, 1, 0, 0, 1), '0.1.0', (0, 10, 0, 0, 1), '0.10.0']
+        expect(stats.majors) == {0: 3, 1: 2, 2: 1}
+        expect(stats.minors) == {(0, 1): 1, (0, 2): 1, (0, 10): 1,
+                                 (1, 0): 2, (2, 0): 1}
+
+
+def test_inventory_stats_lagging():
+    stats = InventoryStats()
+    stats.add_lines(RECORDS.splitlines())
+    expect(stats.lagging('1.0.1')) == ['foo', ]
+    expect(stats.lagging('2.0.0.2')) == ['bar', 'baz', 'foo']
+
+
+def test_inventory_stats_report():
+    stats = InventoryStats()
+    stats.add_lines(['foo 0.1.0', 'foo 0.2', 'bar 1.0'])
+    output = StringIO()
+    stats.report(output, '1.0')
+    expect(output.getvalue()) == '\n'.join([
+        'Records: 3, packages: 2, invalid: 0',
+        'Packages:',
+        '  bar: 1 records, oldest 1.0, latest 1.0',
+        '  foo: 2 records, oldest 0.1.0, latest 0.2',
+        'Major versions:',
+        '  0: 2',
+        '  1: 1',
+        'Minor versions:',
+        '  0.1: 1',
+        '  0.2: 1',
+        '  1.0: 1',
+        'Lagging behind 1.0:',
+        '  foo: 0.2',
+        '',
+    ])
+
+
+def test_main_stats_missing():
+    missing = os.path.join(os.path.dirname(__file__), 'missing')
+    with patch('sys.stdout', new_callable=StringIO) as stdout:
+        expect(main(['versionah', '--stats', missing])) == errno.ENOENT
+    expect(stdout.getvalue()) \
+        == "Unable to open %r: No such file or directory\n" % missing
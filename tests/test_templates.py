@@ -0,0 +1,146 @@
+import datetime
+import os
+import shutil
+import tempfile
+
+import jinja2
+
+from expecter import expect
+from mock import patch
+from nose2.tools import params
+
+from versionah import (FILTERS, NATIVE_TEMPLATES, TEMPLATES_DIR,
+                       CompiledLoader, IndexedLoader, TemplateIndex, Version,
+                       compile_templates)
+
+
+TEMPDIR = None
+
+
+def setUpModule():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+    compile_templates(TEMPDIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+def test_compiled_loader_available():
+    expect(CompiledLoader.available(TEMPDIR)).isinstance(CompiledLoader)
+
+
+def test_compiled_loader_unavailable():
+    expect(CompiledLoader.available(os.path.dirname(__file__))) == None
+
+
+def test_compiled_loader_stale():
+    tempdir = tempfile.mkdtemp()
+    try:
+        open(os.path.join(tempdir, 'stamp'), 'w').write('0.1 2')
+        expect(CompiledLoader.available(tempdir)) == None
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_compiled_loader_source():
+    compiled = jinja2.Environment(loader=CompiledLoader(TEMPDIR))
+    compiled.filters.update(FILTERS)
+    filename = os.path.join(TEMPLATES_DIR, 'h.jinja')
+    expect(compiled.get_template('h.jinja').filename) == filename
+    expect(compiled.loader.get_source(compiled, 'h.jinja')[0]) \
+        == open(filename).read()
+
+
+def test_compiled_template_path():
+    env = jinja2.Environment(loader=jinja2.ChoiceLoader(
+        [CompiledLoader(TEMPDIR),
+         jinja2.PackageLoader('versionah', 'templates')]))
+    env.filters.update(FILTERS)
+    with patch.object(Version, 'env', env):
+        expect(Version.template_path('h')) \
+            == os.path.join(TEMPLATES_DIR, 'h.jinja')
+
+
+@params(*Version.filetypes)
+def test_compiled_template_output(file_type):
+    compiled = jinja2.Environment(loader=CompiledLoader(TEMPDIR))
+    compiled.filters.update(FILTERS)
+    source = jinja2.Environment(
+        loader=jinja2.PackageLoader('versionah', 'templates'))
+    source.filters.update(FILTERS)
+    data = {'name': 'test', 'filename': 'version.h', 'magic': 'magic',
+            'dotted': '0.1.0', 'hex': '0x000100', 'libtool': '1:20',
+            'date': '2012-05-11', 'tuple': (0, 1, 0), 'web': 'test/0.1.0',
+            'dateobj': datetime.date(2012, 5, 11)}
+    name = '%s.jinja' % file_type
+    expect(compiled.get_template(name).render(data)) \
+        == source.get_template(name).render(data)
+
+
+def test_template_index():
+    tempdir = tempfile.mkdtemp()
+    try:
+        missing = os.path.join(tempdir, 'missing')
+        index = TemplateIndex([missing, tempdir])
+        expect(index.list_templates()) == []
+        open(os.path.join(tempdir, 'py.jinja'), 'w').write('{{ dotted }}')
+        os.utime(tempdir, (0, 0))
+        expect(index.list_templates()) == ['py.jinja', ]
+        expect(index.find('py.jinja')) == [tempdir, ]
+        expect(index.find('h.jinja')) == []
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_indexed_loader():
+    tempdir = tempfile.mkdtemp()
+    try:
+        first = os.path.join(tempdir, 'first')
+        second = os.path.join(tempdir, 'second')
+        for directory in (first, second):
+            os.mkdir(directory)
+            open(os.path.join(directory, 'py.jinja'), 'w').write(directory)
+        env = jinja2.Environment(
+            loader=IndexedLoader(TemplateIndex([first, second])))
+        expect(env.get_template('py.jinja').render()) == first
+        with expect.raises(jinja2.TemplateNotFound):
+            env.get_template('h.jinja')
+    finally:
+        shutil.rmtree(tempdir)
+
+
+@params(*sorted(NATIVE_TEMPLATES))
+def test_native_golden(file_type):
+    v = Version((1, 2, 3), 'test-pkg', datetime.date(2012, 5, 11))
+    golden = open(os.path.join(os.path.dirname(__file__), 'data', 'golden',
+                               file_type)).read()
+    expect(v._render_native('include/version.h', file_type)) == golden
+    expect(v._render_jinja('include/version.h', file_type)) == golden
+
+
+@params(
+    ((0, 1), 'test', 'version.h'),
+    ((3, 9, 21, 255), 'My_Pkg', '/tmp/some-dir/version2.h'),
+    ((10, 0, 0), 'pkg', 'v.py'),
+)
+def test_native_matches_jinja(components, name, filename):
+    v = Version(components, name, datetime.date(2011, 12, 31))
+    for file_type in NATIVE_TEMPLATES:
+        expect(v._render_native(filename, file_type)) \
+            == v._render_jinja(filename, file_type)
+
+
+def test_native_user_override():
+    v = Version((0, 1, 0), 'test', datetime.date(2012, 5, 11))
+    tempdir = tempfile.mkdtemp()
+    try:
+        open(os.path.join(tempdir, 'text.jinja'), 'w').write('{{ web }}')
+        index = TemplateIndex([tempdir])
+        env = jinja2.Environment(loader=IndexedLoader(index))
+        with patch.object(Version, 'template_index', index):
+            with patch.object(Version, 'env', env):
+                expect(v.render('text', 'version.txt')) == 'test/0.1.0'
+    finally:
+        shutil.rmtree(tempdir)
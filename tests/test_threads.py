@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import tempfile
+from datetime import date
+from multiprocessing.pool import ThreadPool
+
+from expecter import expect
+
+from versionah import (NATIVE_TEMPLATES, TemplateIndex, Version)
+
+
+def make_versions(count):
+    rand = random.Random(42)
+    return [Version((rand.randint(0, 9), rand.randint(0, 99),
+                     rand.randint(0, 99)), 'pkg%d' % n, date(2012, 5, 11))
+            for n in range(count)]
+
+
+def test_threaded_render():
+    jobs = [(version, file_type) for version in make_versions(500)
+            for file_type in sorted(NATIVE_TEMPLATES)]
+    expected = [version._render_jinja('version', file_type)
+                for version, file_type in jobs]
+    pool = ThreadPool(16)
+    try:
+        native = pool.map(lambda job: job[0].render(job[1]), jobs,
+                          chunksize=1)
+        jinja = pool.map(lambda job: job[0]._render_jinja('version', job[1]),
+                         jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    expect(native == expected) == True
+    expect(jinja == expected) == True
+
+
+def test_threaded_render_unchanged():
+    versions = make_versions(2000)
+    before = [vars(version).copy() for version in versions]
+    pool = ThreadPool(16)
+    try:
+        pool.map(lambda version: version.render('py'), versions)
+    finally:
+        pool.close()
+        pool.join()
+    expect([vars(version) for version in versions] == before) == True
+
+
+def test_threaded_write_read():
+    tempdir = tempfile.mkdtemp()
+    filename = os.path.join(tempdir, 'version.py')
+    versions = make_versions(1000)
+
+    def write_read(version):
+        version.write(filename, 'py')
+        return Version.read(filename).name
+
+    pool = ThreadPool(16)
+    try:
+        names = pool.map(write_read, versions, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    try:
+        expect(set(names) <= set(v.name for v in versions)) == True
+        expect(os.listdir(tempdir)) == ['version.py']
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_threaded_intern():
+    pool = ThreadPool(16)
+    try:
+        found = pool.map(lambda n: Version.intern((0, n % 4, 0), 'test'),
+                         range(4000), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    expect(len(set(id(version) for version in found))) == 4
+
+
+def test_threaded_template_index():
+    tempdir = tempfile.mkdtemp()
+    try:
+        for n in range(50):
+            open(os.path.join(tempdir, 't%d.jinja' % n), 'w').close()
+        index = TemplateIndex([tempdir])
+        pool = ThreadPool(16)
+        try:
+            found = pool.map(lambda n: index.find('t%d.jinja' % (n % 50)),
+                             range(4000), chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        expect(found == [[tempdir]] * 4000) == True
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_write_symlink():
+    tempdir = tempfile.mkdtemp()
+    try:
+        target = os.path.join(tempdir, 'target.py')
+        link = os.path.join(tempdir, 'link.py')
+        Version((1, 0), 'test', date(2012, 5, 11)).write(target, 'py')
+        os.symlink('target.py', link)
+        Version((2, 0), 'test', date(2012, 5, 11)).write(link, 'py')
+        expect(os.path.islink(link)) == True
+        expect(Version.read(target).components) == (2, 0)
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def test_write_hard_link():
+    tempdir = tempfile.mkdtemp()
+    try:
+        target = os.path.join(tempdir, 'target.py')
+        link = os.path.join(tempdir, 'link.py')
+        Version((1, 0), 'test', date(2012, 5, 11)).write(target, 'py')
+        os.link(target, link)
+        os.chmod(target, 0o600)
+        Version((2, 0), 'test', date(2012, 5, 11)).write(link, 'py')
+        expect(os.path.samefile(target, link)) == True
+        expect(Version.read(target).components) == (2, 0)
+        expect(os.stat(target).st_mode & 0o777) == 0o600
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,175 @@
+import errno
+import os
+import shutil
+import tempfile
+
+from expecter import expect
+from mock import patch
+
+from versionah import (Version, main, recover, update_files)
+
+
+TEMPDIR = None
+FILES = None
+
+
+def setUp():
+    global TEMPDIR, FILES
+    TEMPDIR = tempfile.mkdtemp()
+    FILES = [(os.path.join(TEMPDIR, name), file_type)
+             for name, file_type in (('a.py', 'py'), ('b.h', 'h'),
+                                     ('c', 'text'))]
+    for filename, file_type in FILES:
+        Version((0, 1, 0), 'test').write(filename, file_type)
+
+
+def tearDown():
+    shutil.rmtree(TEMPDIR)
+
+
+def read_all():
+    return [Version.read(filename).components for filename, _ in FILES]
+
+
+def crash_after(count):
+    """Create a rename stand-in that fails after count calls"""
+    real_rename = os.rename
+    calls = []
+
+    def rename(source, target):
+        if source.endswith('.versionah-new'):
+            if len(calls) >= count:
+                raise OSError('simulated crash')
+            calls.append(source)
+        real_rename(source, target)
+    return rename
+
+
+def test_update_files():
+    journal = os.path.join(TEMPDIR, 'journal')
+    versions = update_files(FILES, journal, 'minor')
+    expect([v.components for v in versions]) == [(0, 2, 0), ] * 3
+    expect(read_all()) == [(0, 2, 0), ] * 3
+    expect(sorted(os.listdir(TEMPDIR))) == ['a.py', 'b.h', 'c']
+test_update_files.setUp = setUp
+test_update_files.tearDown = tearDown
+
+
+def test_recover_forward():
+    journal = os.path.join(TEMPDIR, 'journal')
+    with patch('versionah._RENAME', new=crash_after(2)):
+        with expect.raises(OSError):
+            update_files(FILES, journal, 'minor')
+    expect(read_all()) == [(0, 2, 0), (0, 2, 0), (0, 1, 0)]
+    recover(journal, 'forward')
+    expect(read_all()) == [(0, 2, 0), ] * 3
+    expect(os.path.exists(journal)) == False
+test_recover_forward.setUp = setUp
+test_recover_forward.tearDown = tearDown
+
+
+def test_recover_back():
+    journal = os.path.join(TEMPDIR, 'journal')
+    with patch('versionah._RENAME', new=crash_after(2)):
+        with expect.raises(OSError):
+            update_files(FILES, journal, 'minor')
+    recover(journal, 'back')
+    expect(read_all()) == [(0, 1, 0), ] * 3
+    expect(os.path.exists(journal)) == False
+test_recover_back.setUp = setUp
+test_recover_back.tearDown = tearDown
+
+
+def test_update_files_mode():
+    journal = os.path.join(TEMPDIR, 'journal')
+    os.chmod(FILES[0][0], 0o600)
+    update_files(FILES, journal, 'minor')
+    expect(os.stat(FILES[0][0]).st_mode & 0o777) == 0o600
+test_update_files_mode.setUp = setUp
+test_update_files_mode.tearDown = tearDown
+
+
+def test_update_files_duplicate():
+    journal = os.path.join(TEMPDIR, 'journal')
+    with expect.raises(ValueError):
+        update_files(FILES + FILES[:1], journal, 'minor')
+    expect(read_all()) == [(0, 1, 0), ] * 3
+    expect(os.path.exists(journal)) == False
+test_update_files_duplicate.setUp = setUp
+test_update_files_duplicate.tearDown = tearDown
+
+
+def test_update_files_expect():
+    journal = os.path.join(TEMPDIR, 'journal')
+    try:
+        update_files(FILES, journal, 'minor', expect='9.9.9')
+    except IOError as error:
+        expect(error.errno) == errno.EAGAIN
+    else:
+        raise AssertionError('IOError not raised')
+    expect(read_all()) == [(0, 1, 0), ] * 3
+    expect(sorted(os.listdir(TEMPDIR))) == ['a.py', 'b.h', 'c']
+    update_files(FILES, journal, 'minor', expect='0.1.0')
+    expect(read_all()) == [(0, 2, 0), ] * 3
+test_update_files_expect.setUp = setUp
+test_update_files_expect.tearDown = tearDown
+
+
+def test_main_transaction_expect():
+    journal = os.path.join(TEMPDIR, 'journal')
+    args = ['versionah', '-x', '--journal', journal, '-b', 'minor',
+            '--expect', '9.9.9'] + [filename for filename, _ in FILES]
+    expect(main(args)) == errno.EAGAIN
+    expect(read_all()) == [(0, 1, 0), ] * 3
+test_main_transaction_expect.setUp = setUp
+test_main_transaction_expect.tearDown = tearDown
+
+
+def test_update_files_symlink():
+    journal = os.path.join(TEMPDIR, 'journal')
+    link = os.path.join(TEMPDIR, 'link')
+    os.symlink('c', link)
+    update_files([(link, 'text')], journal, 'minor')
+    expect(os.path.islink(link)) == True
+    expect(Version.read(FILES[2][0]).components) == (0, 2, 0)
+test_update_files_symlink.setUp = setUp
+test_update_files_symlink.tearDown = tearDown
+
+
+def test_update_files_hard_link():
+    journal = os.path.join(TEMPDIR, 'journal')
+    link = os.path.join(TEMPDIR, 'link')
+    os.link(FILES[2][0], link)
+    update_files([(link, 'text')], journal, 'minor')
+    expect(os.path.samefile(FILES[2][0], link)) == True
+    expect(Version.read(FILES[2][0]).components) == (0, 2, 0)
+    expect(sorted(os.listdir(TEMPDIR))) == ['a.py', 'b.h', 'c', 'link']
+test_update_files_hard_link.setUp = setUp
+test_update_files_hard_link.tearDown = tearDown
+
+
+def test_recover_hard_link():
+    journal = os.path.join(TEMPDIR, 'journal')
+    links = []
+    for filename, file_type in FILES:
+        os.link(filename, filename + '.link')
+        links.append((filename + '.link', file_type))
+    with patch('versionah.os.remove', side_effect=OSError('crash')):
+        with expect.raises(OSError):
+            update_files(links, journal, 'minor')
+    recover(journal, 'back')
+    expect(read_all()) == [(0, 1, 0), ] * 3
+    expect(os.path.exists(journal)) == False
+test_recover_hard_link.setUp = setUp
+test_recover_hard_link.tearDown = tearDown
+
+
+def test_main_recover_invalid_journal():
+    journal = os.path.join(TEMPDIR, 'journal')
+    for data in ('{"entries": [["a", "b"', '{}', '{"entries": [["a"]]}'):
+        open(journal, 'w').write(data)
+        expect(main(['versionah', '--journal', journal, '--recover',
+                     'forward'])) == errno.EINVAL
+    expect(read_all()) == [(0, 1, 0), ] * 3
+test_main_recover_invalid_journal.setUp = setUp
+test_main_recover_invalid_journal.tearDown = tearDown
@@ -0,0 +1,73 @@
+from datetime import date
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (Version, filter_stream, format_dotted, format_hex,
+                       format_libtool, parse_date, parse_dates, parse_record)
+
+
+@params(
+    ('2011-02-19', date(2011, 2, 19)),
+    ('02-Mar-2011', date(2011, 3, 2)),
+    ('31-Dec-1999', date(1999, 12, 31)),
+)
+def test_parse_date(string, expected):
+    expect(parse_date(string)) == expected
+
+
+@params('20_1-02-19', '+011-02-19', '2011- 2-19', '2011-02-30', '02-Foo-2011',
+        ' 2-Mar-2011', '02-Mar-+011', '2011/02/19')
+def test_parse_date_invalid(string):
+    with expect.raises(ValueError):
+        parse_date(string)
+
+
+def test_parse_dates():
+    expect(parse_dates(['2011-02-19', '02-Mar-2011', '2011-02-19'])) \
+        == [date(2011, 2, 19), date(2011, 3, 2), date(2011, 2, 19)]
+
+
+@params(
+    ('0.1.0', Version((0, 1, 0))),
+    ('test 1.2.3 2011-02-19\n', Version((1, 2, 3), 'test', date(2011, 2, 19))),
+)
+def test_parse_record(line, expected):
+    version = parse_record(line)
+    expect(repr(version)) == repr(expected)
+
+
+@params(
+    ('report', 'unknown/0.1.0\ntest/1.2\n', "2: Invalid record 'bad line'\n"),
+    ('pass', 'unknown/0.1.0\nbad line\ntest/1.2\n', ''),
+)
+def test_filter_stream(invalid, expected, reported):
+    stream = StringIO('0.1.0\nbad line\ntest 1.2 02-Mar-2011\n')
+    output = StringIO()
+    errors = StringIO()
+    expect(filter_stream(stream, output, 'web', invalid, errors,
+                         buffer_lines=2)) == 1
+    expect(output.getvalue()) == expected
+    expect(errors.getvalue()) == reported
+
+
+@params(
+    (format_dotted, ['0.1.0', '1.2', '2000.1.0.4']),
+    (format_hex, ['0x000100', '0x0102', '0x7d0010004']),
+    (format_libtool, ['1:20', '12:20', '20001:20']),
+)
+def test_bulk_formatters(formatter, expected):
+    expect(formatter([(0, 1, 0), [1, 2], (2000, 1, 0, 4)])) == expected
+
+
+@params('dotted', 'hex', 'libtool')
+def test_bulk_formatters_match_methods(display_type):
+    components = [(0, 1, 0), (1, 2), (1, 2, 3, 4), (300, 1024, 3)]
+    formatter = globals()['format_%s' % display_type]
+    expect(formatter(components)) \
+        == [Version(c).display(display_type) for c in components]
@@ -40,3 +40,102 @@ def test_version_bump(bump_type, expected):
 def test_version_display(display_type, expected):
     v = Version(date=date(2012, 5, 11))
     expect(v.display(display_type)) == expected
+
+
+def test_version_intern():
+    v = Version.intern((0, 1, 0), 'test', date(2012, 5, 11))
+    expect(Version.intern([0, 1, 0], 'test', date(2012, 5, 11)) is v) == True
+    expect(Version.intern('0.1.0', 'test', date(2012, 5, 11)) is v) == True
+    expect(Version.intern((0, 1, 0), 'other', date(2012, 5, 11)) is v) \
+        == False
+
+
+def test_version_default_date():
+    expect(Version().date) == date.today()
+
+
+@params(
+    ((0, 1), ),
+    ((0, 1, 0), ),
+    ((1, 2, 3, 4), ),
+)
+def test_version_from_components_unchecked(components):
+    v = Version.from_components_unchecked(components, 'test',
+                                          date(2012, 5, 11))
+    expect(repr(v)) == repr(Version(components, 'test', date(2012, 5, 11)))
+
+
+@params(
+    ((0, 1), ),
+    ((0, 1, 0), ),
+    ((1, 2, 3, 4), ),
+)
+def test_version_from_key(components):
+    v = Version(components, 'test', date(2012, 5, 11))
+    expect(repr(Version.from_key(v.key, 'test', date(2012, 5, 11)))) \
+        == repr(v)
+
+
+def test_version_semver():
+    v = Version('1.2.0-rc.1+build.5', 'test', date(2012, 5, 11))
+    expect(v.components) == (1, 2, 0)
+    expect(v.prerelease) == ('rc', '1')
+    expect(v.build) == ('build', '5')
+    expect(v.as_dotted()) == '1.2.0-rc.1+build.5'
+    expect(v.as_web()) == 'test/1.2.0-rc.1+build.5'
+    expect(repr(v)) \
+        == "Version('1.2.0-rc.1+build.5', 'test', %r)" % date(2012, 5, 11)
+
+
+@params(
+    ('1.2.0-rc.1', '1.2.0', True),
+    ('1.2.0-rc.1', '1.2.0-rc.2', True),
+    ('1.2.0-rc.2', '1.2.0-rc.10', True),
+    ('1.2.0-10', '1.2.0-rc', True),
+    ('1.2.0-rc', '1.2.0-rc.1', True),
+    ('1.2-rc.1', '1.1.9', False),
+)
+def test_version_semver_precedence(lower, higher, expected):
+    expect(Version(lower) < Version(higher)) == expected
+    expect(Version(higher) > lower) == expected
+
+
+def test_version_semver_build_equality():
+    expect(Version('1.2.0+build.1')) == Version('1.2.0+build.2')
+    expect(Version('1.2.0-rc.1') == '1.2.0') == False
+
+
+def test_version_semver_set_bump():
+    v = Version((1, 2, 0))
+    v.set('1.3.0-beta.1+exp.sha.5114f85')
+    expect(v.prerelease) == ('beta', '1')
+    v.bump('micro')
+    expect(v.as_dotted()) == '1.3.1'
+    v.set('1.3.0-beta')
+    v.set((1, 4, 0))
+    expect(v.as_dotted()) == '1.4.0'
+
+
+@params('py', 'json', 'text', 'h')
+def test_version_semver_round_trip(file_type):
+    import os
+    import tempfile
+    v = Version('1.2.0-rc.1+build.5', 'test', date(2012, 5, 11))
+    handle, filename = tempfile.mkstemp(suffix='.%s' % file_type)
+    os.close(handle)
+    try:
+        v.write(filename, file_type)
+        expect(Version.read(filename).as_dotted()) == '1.2.0-rc.1+build.5'
+    finally:
+        os.unlink(filename)
+
+
+def test_version_semver_precedence_updated():
+    v = Version('1.0.0-rc.1')
+    expect(v < Version('1.0.0')) == True
+    v.set('1.0.0')
+    expect(v == Version('1.0.0')) == True
+    v.set((1, 0, 0, 1))
+    expect(v > '1.0.0') == True
+    v.bump('major')
+    expect(v.precedence) == (2, 0, 0, 0, 1)
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from expecter import expect
+from nose2.tools import params
+
+from versionah import (_poll_changes, affected_outputs, parse_output)
+
+
+OUTPUTS = [('version.h', 'h'), ('_version.py', 'py')]
+
+
+@params(
+    ('version.h:h', ('version.h', 'h')),
+    ('version.h', ('version.h', 'h')),
+    ('VERSION', ('VERSION', 'text')),
+    ('dir:name/version:py', ('dir:name/version', 'py')),
+)
+def test_parse_output(string, expected):
+    expect(parse_output(string)) == expected
+
+
+def test_affected_outputs_source():
+    changed = set([os.path.abspath('VERSION'), ])
+    expect(affected_outputs(changed, 'VERSION', OUTPUTS)) == OUTPUTS
+
+
+def test_affected_outputs_template():
+    changed = set(['/home/user/.local/versionah/templates/py.jinja', ])
+    expect(affected_outputs(changed, 'VERSION', OUTPUTS)) \
+        == [('_version.py', 'py'), ]
+
+
+def test_affected_outputs_unrelated():
+    changed = set(['/tmp/other', ])
+    expect(affected_outputs(changed, 'VERSION', OUTPUTS)) == []
+
+
+def test_poll_changes():
+    tempdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tempdir, 'VERSION')
+        open(source, 'w').write('This is test version 0.1.0 (2012-05-11)')
+        changes = _poll_changes(source, 0.01, 0.01)
+
+        def update():
+            open(source, 'w').write(
+                'This is test version 0.2.0 (2012-05-11)\n')
+        threading.Timer(0.05, update).start()
+        expect(next(changes)) == set([source, ])
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+
+from expecter import expect
+
+from versionah import (Version, Workspace, main)
+
+
+MANIFEST = """[base]
+file = base/VERSION
+
+[lib]
+file = lib/version.py
+outputs = lib/version.h:h
+depends = base
+
+[app]
+file = app/VERSION
+depends = lib base
+
+[tool]
+file = tool/VERSION
+depends = base
+
+[other]
+file = other/VERSION
+"""
+
+TEMPDIR = None
+
+
+def setUp():
+    global TEMPDIR
+    TEMPDIR = tempfile.mkdtemp()
+    open(os.path.join(TEMPDIR, 'versionah.ini'), 'w').write(MANIFEST)
+    for name, filename, file_type, components in (
+            ('base', 'base/VERSION', 'text', (1, 0, 0)),
+            ('lib', 'lib/version.py', 'py', (0, 3)),
+            ('app', 'app/VERSION', 'text', (2, 1, 0, 4)),
+            ('tool', 'tool/VERSION', 'text', (0, 1, 0)),
+            ('other', 'other/VERSION', 'text', (0, 1, 0))):
+        path = os.path.join(TEMPDIR, filename)
+        os.mkdir(os.path.dirname(path))
+        Version(components, name, date(2012, 5, 11)).write(path, file_type)
+
+
+def tearDown():
+    shutil.rmtree(TEMPDIR)
+
+
+def read(filename):
+    return Version.read(os.path.join(TEMPDIR, filename)).components
+
+
+def test_workspace_read():
+    workspace = Workspace.read(os.path.join(TEMPDIR, 'versionah.ini'))
+    expect(sorted(workspace.packages)) \
+        == ['app', 'base', 'lib', 'other', 'tool']
+    expect(workspace.packages['lib'][1]) == 'py'
+    expect(workspace.packages['lib'][2]) \
+        == [(os.path.join(TEMPDIR, 'lib/version.h'), 'h')]
+test_workspace_read.setUp = setUp
+test_workspace_read.tearDown = tearDown
+
+
+def test_workspace_waves():
+    workspace = Workspace.read(os.path.join(TEMPDIR, 'versionah.ini'))
+    affected = workspace.cascade(['base'])
+    expect(workspace.waves(affected)) == [['base'], ['lib', 'tool'], ['app']]
+    expect(workspace.cascade(['lib'])) == set(['lib', 'app'])
+test_workspace_waves.setUp = setUp
+test_workspace_waves.tearDown = tearDown
+
+
+def test_workspace_bump():
+    workspace = Workspace.read(os.path.join(TEMPDIR, 'versionah.ini'))
+    bumped = workspace.bump(['base'], 'minor',
+                            journal=os.path.join(TEMPDIR, 'journal'))
+    expect([name for name, _ in bumped]) == ['base', 'lib', 'tool', 'app']
+    expect(read('base/VERSION')) == (1, 1, 0)
+    expect(read('lib/version.py')) == (0, 4)
+    expect(read('lib/version.h')) == (0, 4)
+    expect(read('app/VERSION')) == (2, 1, 0, 5)
+    expect(read('tool/VERSION')) == (0, 1, 1)
+    expect(read('other/VERSION')) == (0, 1, 0)
+test_workspace_bump.setUp = setUp
+test_workspace_bump.tearDown = tearDown
+
+
+def test_workspace_bump_invalid():
+    workspace = Workspace.read(os.path.join(TEMPDIR, 'versionah.ini'))
+    journal = os.path.join(TEMPDIR, 'journal')
+    # lib has only two components, and is bumped after base
+    with expect.raises(ValueError):
+        workspace.bump(['base', 'lib'], 'micro', journal=journal)
+    open(os.path.join(TEMPDIR, 'app/VERSION'), 'w').write('invalid')
+    with expect.raises(ValueError):
+        workspace.bump(['base'], 'minor', journal=journal)
+    expect(read('base/VERSION')) == (1, 0, 0)
+    expect(read('lib/version.py')) == (0, 3)
+    expect(os.path.exists(journal)) == False
+test_workspace_bump_invalid.setUp = setUp
+test_workspace_bump_invalid.tearDown = tearDown
+
+
+def test_workspace_invalid_type():
+    filename = os.path.join(TEMPDIR, 'versionah.ini')
+    open(filename, 'w').write(MANIFEST.replace('file = base/VERSION',
+                                               'file = base/VERSION\n'
+                                               'type = bogus'))
+    try:
+        Workspace.read(filename)
+    except ValueError as error:
+        expect(error.args[0]) \
+            == "Invalid file type 'bogus' for package 'base'"
+    else:
+        raise AssertionError('ValueError not raised')
+test_workspace_invalid_type.setUp = setUp
+test_workspace_invalid_type.tearDown = tearDown
+
+
+def test_workspace_cycle():
+    workspace = Workspace({'a': ('a', 'text', [], ['b']),
+                           'b': ('b', 'text', [], ['a'])})
+    with expect.raises(ValueError):
+        workspace.waves(workspace.cascade(['a']))
+
+
+def test_workspace_unknown_dependency():
+    with expect.raises(ValueError):
+        Workspace({'a': ('a', 'text', [], ['b'])})
+
+
+def test_main_workspace():
+    main(['versionah', '--workspace', os.path.join(TEMPDIR, 'versionah.ini'),
+          '--journal', os.path.join(TEMPDIR, 'journal'), '-b', 'major',
+          'lib'])
+    expect(read('lib/version.py')) == (1, 0)
+    expect(read('app/VERSION')) == (2, 1, 0, 5)
+    expect(read('base/VERSION')) == (1, 0, 0)
+test_main_workspace.setUp = setUp
+test_main_workspace.tearDown = tearDown
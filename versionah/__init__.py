@@ -43,12 +43,34 @@ for use in project management.
 
 import datetime
 import errno
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import mmap
 import optparse
 import os
 import re
+import shutil
+import sqlite3
+import struct
 import sys
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import configparser
+except ImportError:
+    import ConfigParser as configparser  # NOQA
+
+from multiprocessing import (Pool, cpu_count)
+from multiprocessing.pool import ThreadPool
 
 import jinja2
+import jinja2.meta
 
 try:
     from blessings import Terminal
@@ -58,10 +80,19 @@ except ImportError:
             return lambda x: x
 T = Terminal()
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # NOQA
+
 
 #: Base string type, used for compatibility with Python 2 and 3
 STR_TYPE = str if sys.version_info[0] == 3 else basestring
 
+#: Rename replacing any existing target, on all platforms.  Python 2 on
+#: Windows has no such call, in which case this is `None`
+_RENAME = getattr(os, "replace", None if os.name == "nt" else os.rename)
+
 #: Command line help string, for use with :mod:`optparse`
 # Pull the first paragraph from the docstring
 USAGE = "\n".join(__doc__[:__doc__.find('\n\n', 100)].splitlines()[2:])
@@ -70,8 +101,11 @@ USAGE = USAGE.replace("versionah", "%prog")
 
 #: Regular expression to match a valid package name
 VALID_PACKAGE = "[A-Za-z][A-Za-z0-9]+(?:[_-][A-Za-z0-9]+)*"
-#: Regular expression to match a valid package version
-VALID_VERSION = r"\d+\.\d+(?:\.\d+){,2}"
+#: Regular expression to match a valid package version, with optional SemVer
+#: pre-release and build metadata
+VALID_VERSION = (r"\d+\.\d+(?:\.\d+){,2}"
+                 r"(?:-[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?"
+                 r"(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?")
 #: Regular expression to match a package date.  ISO-8601, and %d-%b-%Y
 #: formatting for shtool compatibility
 VALID_DATE = r"(?:\d{4}-\d{2}-\d{2}|\d{2}-(?:[A-Z][a-z]{2})-\d{4})"
@@ -126,10 +160,697 @@ def filter_regexp(string, pattern, repl, count=0, flags=0):
         return match.sub(repl, string, count)
 FILTERS["regexp"] = filter_regexp
 
+_C_HEADER = """/* %(magic)s */
+
+
+#ifndef _%(escaped_name)s_INCLUDE_
+#define _%(escaped_name)s_INCLUDE_
+
+#define VERSION "%(dotted)s"
+#define VERSION_HEX %(hex)s
+#define VERSION_LIBTOOL "%(libtool)s"
+#define VERSION_DATE "%(date)s"
+#define VERSION_WEB "%(web)s"
+
+#endif /* %(escaped_name)s */
+"""
+
+#: Format strings producing the same output as the bundled templates, used to
+#: write built-in file types without the cost of Jinja
+NATIVE_TEMPLATES = {
+    "c": _C_HEADER,
+    "h": _C_HEADER,
+    "json": """{
+    "magic": "%(magic)s",
+    "dotted": "%(dotted)s",
+    "hex": "%(hex)s",
+    "libtool": "%(libtool)s",
+    "date": "%(date)s",
+    "web": "%(web)s"
+}""",
+    "m4": """# %(magic)s
+
+m4_define([v_dotted], [%(dotted)s])
+m4_define([v_hex],   [%(hex)s])
+m4_define([v_libtool], [%(libtool)s])
+m4_define([v_date], [%(date)s])
+m4_define([v_web], [%(web)s])
+""",
+    "py": """# %(magic)s
+# pylint: disable=C0103, C0111, C0121, W0622
+
+dotted = "%(dotted)s"
+libtool = "%(libtool)s"
+hex = %(hex)s
+date = "%(date)s"
+tuple = %(tuple)s
+web = "%(web)s"
+""",
+    "rb": """# %(magic)s
+
+module %(capitalized_name)s
+    DOTTED = "%(dotted)s"
+    LIBTOOL = "%(libtool)s"
+    HEX = %(hex)s
+    DATE = "%(date)s"
+    WEB = "%(web)s"
+end
+""",
+    "text": "%(magic)s\n",
+}
+_NON_UPPER = re.compile("[^A-Z]")
+
+#: Custom display formats, mapping names to functions that take a `Version`
+FORMATS = {}
+#: Entry point group for display format plugins
+FORMAT_ENTRY_POINT = "versionah.formats"
+#: Entry point group for file type plugins
+FILETYPE_ENTRY_POINT = "versionah.filetypes"
+_ENTRY_POINTS = {}
+#: Lock for loading plugins from multiple threads
+_PLUGIN_LOCK = threading.RLock()
+
+
+def _entry_points(group):
+    """Find entry points for a group, without loading them.
+
+    Results are cached, as scanning installed packages is slow.
+
+    :param str group: Entry point group name
+    :rtype: `dict`
+    :return: Map of entry point names to entry points
+
+    """
+    with _PLUGIN_LOCK:
+        if group not in _ENTRY_POINTS:
+            try:
+                from importlib.metadata import entry_points
+            except ImportError:
+                try:
+                    from pkg_resources import iter_entry_points
+                except ImportError:
+                    found = []
+                else:
+                    found = iter_entry_points(group)
+            else:
+                found = entry_points()
+                if hasattr(found, "select"):
+                    found = found.select(group=group)
+                else:
+                    found = found.get(group, [])
+            _ENTRY_POINTS[group] = dict((point.name, point)
+                                        for point in found)
+    return _ENTRY_POINTS[group]
+
+
+def get_formatter(name):
+    """Find a custom display format function.
+
+    Plugins are only loaded when their format is first requested.
+
+    :param str name: Display format name
+    :rtype: `function`
+    :return: Function to format a `Version`
+    :raise ValueError: Unknown display format
+
+    """
+    with _PLUGIN_LOCK:
+        if name not in FORMATS:
+            point = _entry_points(FORMAT_ENTRY_POINT).get(name)
+            if point is None:
+                raise ValueError("Unknown display format %r" % name)
+            FORMATS[name] = point.load()
+    return FORMATS[name]
+
+
+class PluginLoader(jinja2.BaseLoader):
+
+    """Loader for templates provided by file type plugins.
+
+    Entry points in the `FILETYPE_ENTRY_POINT` group name a template source
+    string, or a function returning one.
+
+    """
+
+    def get_source(self, environment, template):
+        """Load template source from a plugin.
+
+        See :meth:`jinja2.BaseLoader.get_source`.
+
+        """
+        point = None
+        if template.endswith(".jinja"):
+            point = _entry_points(FILETYPE_ENTRY_POINT).get(template[:-6])
+        if point is None:
+            raise jinja2.TemplateNotFound(template)
+        source = point.load()
+        if callable(source):
+            source = source()
+        return source, None, lambda: True
+
+    def list_templates(self):
+        """List available templates.
+
+        Plugins aren't listed, so that finding the bundled templates doesn't
+        require a scan of installed packages.
+
+        :rtype: `list`
+        :return: Empty list
+
+        """
+        return []
+
+
+def is_filetype(name):
+    """Check whether a file type is supported.
+
+    :param str name: File type
+    :rtype: `bool`
+
+    """
+    return name in Version.filetypes \
+        or name in _entry_points(FILETYPE_ENTRY_POINT)
+
+
+#: Location of bundled templates
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+#: Location of precompiled bundled templates, see :func:`compile_templates`
+COMPILED_DIR = os.path.join(os.path.dirname(__file__), "compiled")
+
+
+def _compiled_stamp():
+    """Identify the environment compiled templates are valid for.
+
+    :rtype: `str`
+    :return: Jinja and Python versions
+
+    """
+    return "%s %d" % (jinja2.__version__, sys.version_info[0])
+
+
+class CompiledLoader(jinja2.ModuleLoader):
+
+    """Loader for templates precompiled by :func:`compile_templates`.
+
+    Sources are read from the directory the templates were compiled from, so
+    loaded templates report the filename of their source and can be parsed.
+
+    """
+
+    has_source_access = True
+
+    def __init__(self, path, source=TEMPLATES_DIR):
+        """Initialise a new `CompiledLoader` object.
+
+        :param str path: Directory of compiled templates
+        :param str source: Directory of template sources
+
+        """
+        super(CompiledLoader, self).__init__(path)
+        self.source = jinja2.FileSystemLoader(source)
+
+    def get_source(self, environment, template):
+        """Read a template's source.
+
+        :param jinja2.Environment environment: Environment loading template
+        :param str template: Template name
+        :rtype: `tuple`
+        :return: Source, filename and up to date check
+        :raise jinja2.TemplateNotFound: No source for ``template``
+
+        """
+        return self.source.get_source(environment, template)
+
+    def load(self, environment, name, globals=None):
+        """Load a compiled template.
+
+        :param jinja2.Environment environment: Environment loading template
+        :param str name: Template name
+        :param dict globals: Template globals
+        :rtype: `jinja2.Template`
+        :raise jinja2.TemplateNotFound: No compiled template for ``name``
+
+        """
+        template = super(CompiledLoader, self).load(environment, name,
+                                                    globals)
+        template.filename = os.path.join(self.source.searchpath[0], name)
+        return template
+
+    def list_templates(self):
+        """List available templates.
+
+        Compiled templates are stored by hashed name, so can't be listed.
+        They are always accompanied by their sources in the package, which
+        are listed by the :class:`~jinja2.PackageLoader`.
+
+        :rtype: `list`
+        :return: Empty list
+
+        """
+        return []
+
+    @classmethod
+    def available(cls, path):
+        """Create loader, if usable templates exist in ``path``.
+
+        :param str path: Directory of compiled templates
+        :rtype: `CompiledLoader`
+        :return: Loader for ``path``, or `None` if templates are unusable
+
+        """
+        try:
+            stamp = open(os.path.join(path, "stamp")).read()
+        except IOError:
+            return None
+        if not stamp == _compiled_stamp():
+            return None
+        return cls(path)
+
+
+class TemplateIndex(object):
+
+    """Cached listing of template directories.
+
+    Listings are revalidated by checking a directory's modification time, so
+    a lookup costs a single :func:`os.stat` call per directory instead of
+    probing every directory for every template.  Only the top level of each
+    directory is indexed.  Indexes can be shared between threads.
+
+    """
+
+    def __init__(self, directories):
+        """Initialise a new `TemplateIndex` object.
+
+        :param list directories: Directories to index, in search order
+
+        """
+        self.directories = list(directories)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def entries(self, directory):
+        """List the entries in an indexed directory.
+
+        :param str directory: Directory to list
+        :rtype: `tuple` of `frozenset`
+        :return: All names in ``directory``, and those that are files
+
+        """
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return frozenset(), frozenset()
+        with self._lock:
+            cached = self._cache.get(directory)
+            if cached and cached[0] == mtime:
+                return cached[1:]
+            names = frozenset(os.listdir(directory))
+            files = frozenset(name for name in names
+                              if os.path.isfile(os.path.join(directory,
+                                                             name)))
+            self._cache[directory] = (mtime, names, files)
+        return names, files
+
+    def find(self, template):
+        """Find directories that may contain a template.
+
+        :param str template: Template name
+        :rtype: `list` of `str`
+        :return: Directories with a matching top level entry, in search order
+
+        """
+        head = template.split("/")[0]
+        return [directory for directory in self.directories
+                if head in self.entries(directory)[0]]
+
+    def list_templates(self):
+        """List templates in all indexed directories.
+
+        :rtype: `list` of `str`
+        :return: Sorted template names
+
+        """
+        found = set()
+        for directory in self.directories:
+            found.update(self.entries(directory)[1])
+        return sorted(found)
+
+
+class IndexedLoader(jinja2.BaseLoader):
+
+    """Template loader for directories listed in a `TemplateIndex`."""
+
+    def __init__(self, index):
+        """Initialise a new `IndexedLoader` object.
+
+        :param TemplateIndex index: Index of template directories
+
+        """
+        self.index = index
+        self._loaders = dict((directory, jinja2.FileSystemLoader(directory))
+                             for directory in index.directories)
+
+    def get_source(self, environment, template):
+        """Get template source from the first directory containing it.
+
+        See :meth:`jinja2.BaseLoader.get_source`.
+
+        """
+        for directory in self.index.find(template):
+            try:
+                return self._loaders[directory].get_source(environment,
+                                                           template)
+            except jinja2.TemplateNotFound:
+                continue
+        raise jinja2.TemplateNotFound(template)
+
+    def list_templates(self):
+        """List templates in indexed directories.
+
+        :rtype: `list` of `str`
+        :return: Sorted template names
+
+        """
+        return self.index.list_templates()
+
+
+def compile_templates(target):
+    """Precompile the bundled templates to Python modules.
+
+    This is run when versionah is built, so that the bundled templates don't
+    need to be compiled by every process that uses them.
+
+    :param str target: Directory to write compiled templates to
+
+    """
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES_DIR))
+    env.filters.update(FILTERS)
+    env.compile_templates(target, zip=None)
+    open(os.path.join(target, "stamp"), "w").write(_compiled_stamp())
+
+
+#: Hash of source and referenced variables for templates, see
+#: `_template_info`
+_TEMPLATE_INFO = weakref.WeakKeyDictionary()
+_TEMPLATE_INFO_LOCK = threading.Lock()
+
+
+def _template_source(env, name):
+    """Read a template's source from the loader that supplies it.
+
+    Loaders are tried in the order a :class:`~jinja2.ChoiceLoader` loads
+    templates, so the source always matches the template that is rendered.
+
+    :param jinja2.Environment env: Environment to load template from
+    :param str name: Template name
+    :rtype: `str`
+    :return: Template source, or `None` if the supplying loader has no access
+        to sources
+    :raise jinja2.TemplateNotFound: No loader supplies ``name``
+
+    """
+    for loader in getattr(env.loader, "loaders", [env.loader, ]):
+        try:
+            if loader.has_source_access:
+                return loader.get_source(env, name)[0]
+            loader.load(env, name)
+            return None
+        except jinja2.TemplateNotFound:
+            pass
+    raise jinja2.TemplateNotFound(name)
+
+
+def _template_info(env, template):
+    """Find the source hash and referenced variables of a template.
+
+    :param jinja2.Environment env: Environment ``template`` was loaded from
+    :param jinja2.Template template: Template to inspect
+    :rtype: `tuple`
+    :return: SHA-1 digest of the template source, and sorted names of the
+        variables it references, or `None` if the source is unavailable or
+        the template references other templates
+
+    """
+    with _TEMPLATE_INFO_LOCK:
+        if template in _TEMPLATE_INFO:
+            return _TEMPLATE_INFO[template]
+    try:
+        source = _template_source(env, template.name)
+        ast = env.parse(source) if source is not None else None
+    except (TypeError, jinja2.TemplateError):
+        ast = None
+    if ast is None:
+        info = None
+    else:
+        if list(jinja2.meta.find_referenced_templates(ast)):
+            info = None
+        else:
+            info = (hashlib.sha1(source.encode("utf-8")).digest(),
+                    sorted(jinja2.meta.find_undeclared_variables(ast)))
+    with _TEMPLATE_INFO_LOCK:
+        _TEMPLATE_INFO[template] = info
+    return info
+
+
+class RenderCache(object):
+
+    """Size bounded cache of rendered output.
+
+    When the cache is full the least recently used entries are evicted, until
+    a quarter of its space is free.  Caches can be shared between threads.
+
+    If a directory is given entries are also stored there, one file per key,
+    so that output is reused between runs.  The directory is bounded in the
+    same way, using file modification times to find the least recently used
+    entries.  Failures to read or write the directory are ignored, as output
+    can always be rendered again.
+
+    """
+
+    def __init__(self, max_size=1 << 20, directory=None):
+        """Initialise a new `RenderCache` object.
+
+        :param int max_size: Maximum characters of output to store in memory,
+            and bytes to store on disk
+        :param str directory: Directory to persist entries in, `None` to only
+            cache in memory
+
+        """
+        self.max_size = max_size
+        self.directory = directory
+        self.hits = self.misses = self.evictions = self.disk_hits = 0
+        self._entries = {}
+        self._size = 0
+        self._disk_size = None
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Fetch cached output.
+
+        :param str key: Cache key
+        :rtype: `str`
+        :return: Cached output, or `None` if ``key`` isn't cached
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._clock += 1
+                entry[1] = self._clock
+                return entry[0]
+        output = self._load(key)
+        with self._lock:
+            if output is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, output)
+        return output
+
+    def put(self, key, output):
+        """Store output in the cache.
+
+        :param str key: Cache key
+        :param str output: Rendered output
+
+        """
+        if len(output) > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._store(key, output)
+        self._save(key, output)
+
+    def _store(self, key, output):
+        """Add an entry to the in-memory cache, with the lock held."""
+        self._clock += 1
+        self._entries[key] = [output, self._clock]
+        self._size += len(output)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries."""
+        target = self.max_size * 3 // 4
+        for key, (output, _) in sorted(self._entries.items(),
+                                       key=lambda item: item[1][1]):
+            if self._size <= target:
+                break
+            del self._entries[key]
+            self._size -= len(output)
+            self.evictions += 1
+
+    def _load(self, key):
+        """Read an entry from the cache directory.
+
+        Entries are touched when read, to mark them as recently used.
+
+        :param str key: Cache key
+        :rtype: `str`
+        :return: Stored output, or `None` if ``key`` isn't stored
+
+        """
+        if not self.directory:
+            return None
+        filename = os.path.join(self.directory, key)
+        try:
+            with io.open(filename, encoding="utf-8", newline="") as stream:
+                output = stream.read()
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+        return output
+
+    def _save(self, key, output):
+        """Write an entry to the cache directory.
+
+        Entries are written to a temporary file and renamed in to place, so
+        concurrent runs never read partial entries.
+
+        :param str key: Cache key
+        :param str output: Rendered output
+
+        """
+        if not self.directory:
+            return
+        filename = os.path.join(self.directory, key)
+        if os.path.exists(filename):
+            return
+        temp = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            handle, temp = tempfile.mkstemp(prefix=".", dir=self.directory)
+            with io.open(handle, "w", encoding="utf-8",
+                         newline="") as stream:
+                stream.write(output)
+            os.rename(temp, filename)
+            size = os.path.getsize(filename)
+        except (IOError, OSError):
+            if temp and os.path.exists(temp):
+                os.remove(temp)
+            return
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, _, size in
+                                      self._disk_entries())
+            else:
+                self._disk_size += size
+            if self._disk_size > self.max_size:
+                self._evict_disk()
+
+    def _disk_entries(self):
+        """List entries in the cache directory.
+
+        :rtype: `list` of `tuple`
+        :return: Filename, modification time and size of each entry
+
+        """
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            # Temporary files from unfinished writes start with a dot
+            if name.startswith("."):
+                continue
+            filename = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((filename, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict_disk(self):
+        """Drop least recently used entries from the cache directory."""
+        target = self.max_size * 3 // 4
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        self._disk_size = sum(size for _, _, size in entries)
+        for filename, _, size in entries:
+            if self._disk_size <= target:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            self._disk_size -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Empty the cache, and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = self.disk_hits = 0
+            if self.directory:
+                for filename, _, _ in self._disk_entries():
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+                self._disk_size = 0
+
+    @property
+    def hit_rate(self):
+        """Fraction of lookups found in the cache.
+
+        :rtype: `float`
+
+        """
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+    def report(self):
+        """Summarise cache usage.
+
+        :rtype: `str`
+        :return: Human readable statistics
+
+        """
+        text = ("%d hits, %d misses (%.1f%% hit rate), %d evictions, "
+                "%d entries using %d characters"
+                % (self.hits, self.misses, self.hit_rate * 100,
+                   self.evictions, len(self._entries), self._size))
+        if self.directory:
+            text += ", %d hits from %s" % (self.disk_hits, self.directory)
+        return text
+
 
 class Version(object):
 
-    """Main version identifier representation."""
+    """Main version identifier representation.
+
+    Comparisons use the precomputed `precedence` key, which is updated by
+    `Version.set` and `Version.bump`.  Components and pre-release identifiers
+    shouldn't be assigned directly.
+
+    """
 
     if sys.platform == 'darwin':
         fallback_dir = os.path.expanduser('~/Library/Application Support')
@@ -144,24 +865,42 @@ class Version(object):
     for directory in system_dirs:
         pkg_data_dirs.append(mk_data_dir(directory))
 
+    template_index = TemplateIndex(pkg_data_dirs)
     env = jinja2.Environment(loader=jinja2.ChoiceLoader(
-        list(jinja2.FileSystemLoader(s) for s in pkg_data_dirs)))
+        [IndexedLoader(template_index), ]))
+    if CompiledLoader.available(COMPILED_DIR):
+        env.loader.loaders.append(CompiledLoader(COMPILED_DIR))
     env.loader.loaders.append(jinja2.PackageLoader("versionah", "templates"))
+    env.loader.loaders.append(PluginLoader())
     env.filters.update(FILTERS)
     filetypes = [s.split(".")[0] for s in env.list_templates()]
 
-    def __init__(self, components=(0, 1, 0), name="unknown",
-                 date=datetime.date.today()):
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME",
+                       os.path.join(os.environ.get("HOME", "/"), ".cache")),
+        "versionah")
+
+    #: Cache of output rendered from Jinja templates, `None` to disable
+    render_cache = RenderCache(directory=cache_dir)
+
+    #: Shared instances created by `Version.intern`
+    _interned = weakref.WeakValueDictionary()
+    _interned_lock = threading.Lock()
+
+    def __init__(self, components=(0, 1, 0), name="unknown", date=None):
         """Initialise a new `Version` object.
 
-        :type components: `int` or `tuple` of `int`
-        :param components: Version components
+        :type components: `str` or `tuple` of `int`
+        :param components: Version components, or a version string which may
+            include pre-release and build metadata
         :param str name: Package name
-        :param datetime.date date: Date associated with version
+        :param datetime.date date: Date associated with version, defaults to
+            today
 
         """
+        prerelease = build = ()
         if isinstance(components, STR_TYPE):
-            components = split_version(components)
+            components, prerelease, build = split_version(components, True)
         if not 2 <= len(components) <= 4:
             raise ValueError("Invalid number of components in %r"
                              % (components, ))
@@ -172,9 +911,68 @@ class Version(object):
         self.major = self.minor = self.micro = self.patch = 0
         self._resolution = 0
         self.set(components)
+        self.prerelease = prerelease
+        self.build = build
+        self.precedence = precedence_key(self.components_full, prerelease)
 
         self.name = name
-        self.date = date
+        self.date = datetime.date.today() if date is None else date
+
+    @classmethod
+    def from_components_unchecked(cls, components, name="unknown",
+                                  date=None, prerelease=(), build=()):
+        """Create a `Version` from trusted components.
+
+        No validation is performed, so this must only be used with components
+        that are known to be valid, such as those from `split_version` or
+        another `Version`.
+
+        :param tuple components: Two to four non-negative `int` components
+        :param str name: Package name
+        :param datetime.date date: Date associated with version, defaults to
+            today
+        :param tuple prerelease: Pre-release identifiers
+        :param tuple build: Build metadata identifiers
+        :rtype: `Version`
+        :return: New version object
+
+        """
+        version = cls.__new__(cls)
+        version.major, version.minor, version.micro, version.patch = \
+            (tuple(components) + (0, 0, 0))[:4]
+        version._resolution = len(components)
+        version.prerelease = prerelease
+        version.build = build
+        version.precedence = precedence_key(version.components_full,
+                                            prerelease)
+        version.name = name
+        version.date = datetime.date.today() if date is None else date
+        return version
+
+    @classmethod
+    def from_key(cls, key, name="unknown", date=None):
+        """Create a `Version` from a trusted `Version.key`.
+
+        No validation is performed, see `Version.from_components_unchecked`.
+
+        :param tuple key: Full components and resolution, optionally followed
+            by pre-release and build metadata identifiers
+        :param str name: Package name
+        :param datetime.date date: Date associated with version, defaults to
+            today
+        :rtype: `Version`
+        :return: New version object
+
+        """
+        version = cls.__new__(cls)
+        (version.major, version.minor, version.micro, version.patch,
+         version._resolution) = key[:5]
+        version.prerelease, version.build = key[5:] or ((), ())
+        version.precedence = precedence_key(version.components_full,
+                                            version.prerelease)
+        version.name = name
+        version.date = datetime.date.today() if date is None else date
+        return version
 
     def __repr__(self):
         """Self-documenting string representation.
@@ -183,7 +981,11 @@ class Version(object):
         :return: String representation of object
 
         """
-        return "%s(%r, %r, %r)" % (self.__class__.__name__, self.components,
+        if self.prerelease or self.build:
+            components = self.as_dotted()
+        else:
+            components = self.components
+        return "%s(%r, %r, %r)" % (self.__class__.__name__, components,
                                    self.name, self.date)
 
     def __str__(self):
@@ -201,35 +1003,39 @@ class Version(object):
     def __prepare_cmp_object(other):
         """Prepare object for comparison with Version.
 
-        This presents a tuple for comparison with Version.components_full.
+        This presents a tuple for comparison with Version.precedence.
 
         :type other: `Version`, `list`, `tuple` or `int`
         :param other: Object to munge
         :rtype: `tuple`
-        :return: Full version component tuple for object
+        :return: Precedence key for object
         :raise NotImplementedError: Incomparable other
 
         """
-        if isinstance(other, Version):
-            return other.components_full
+        if isinstance(other, (Version, FrozenVersion)):
+            return other.precedence
         elif isinstance(other, (tuple, list)):
-            return (tuple(other) + (0, 0, 0))[:4]
+            return (tuple(other) + (0, 0, 0))[:4] + (1, )
         elif isinstance(other, str):
-            return (split_version(other) + (0, 0, 0))[:4]
+            components, prerelease, _ = split_version(other, True)
+            return precedence_key((components + (0, 0, 0))[:4], prerelease)
         else:
             raise NotImplementedError("Unable to compare Version and %r"
                                       % type(other))
+    # Unmangled alias, for `FrozenVersion` comparisons
+    _prepare_cmp_object = __prepare_cmp_object
 
     def __eq__(self, other):
         """Test `Version` objects for equality.
 
         Importantly, padded version components are checked so that 0.1 is
-        considered equal to 0.1.0.0.
+        considered equal to 0.1.0.0.  Build metadata is ignored, as SemVer
+        requires.
 
         :rtype: `bool`
 
         """
-        return self.components_full == self.__prepare_cmp_object(other)
+        return self.precedence == self.__prepare_cmp_object(other)
     __ne__ = lambda self, other: not self == (other)
 
     def __lt__(self, other):
@@ -241,7 +1047,7 @@ class Version(object):
         :return: True if ``self`` is strictly less-than ``other``
 
         """
-        return self.components < self.__prepare_cmp_object(other)
+        return self.precedence < self.__prepare_cmp_object(other)
 
     def __gt__(self, other):
         """Strict greater-than test against comparable object.
@@ -252,7 +1058,7 @@ class Version(object):
         :return: True if ``self`` is strictly greater-than ``other``
 
         """
-        return self.components_full > self.__prepare_cmp_object(other)
+        return self.precedence > self.__prepare_cmp_object(other)
 
     def __le__(self, other):
         """Less-than or equal to test against comparable object.
@@ -285,20 +1091,57 @@ class Version(object):
         """
         return hash(repr(self))
 
+    @classmethod
+    def intern(cls, components=(0, 1, 0), name="unknown", date=None):
+        """Fetch a shared, immutable `Version` object.
+
+        Repeated calls with the same arguments return the same object, for as
+        long as a reference to it is held elsewhere.  Validation is only
+        performed when a new object is created.
+
+        :type components: `int` or `tuple` of `int`
+        :param components: Version components
+        :param str name: Package name
+        :param datetime.date date: Date associated with version, defaults to
+            today
+        :rtype: `InternedVersion`
+        :return: Shared version object
+
+        """
+        if date is None:
+            date = datetime.date.today()
+        if isinstance(components, STR_TYPE):
+            key = split_version(components, True) + (name, date)
+        else:
+            key = (tuple(components), (), (), name, date)
+        with cls._interned_lock:
+            version = cls._interned.get(key)
+            if version is None:
+                version = InternedVersion(components, name, date)
+                cls._interned[key] = version
+        return version
+
     def set(self, components):
         """Set version components.
 
-        :type components: `tuple` of `int`
+        Pre-release and build metadata are replaced by those in
+        ``components``, or cleared if it isn't a string.
+
+        :type components: `str` or `tuple` of `int`
         :param components: Version components
 
         """
+        prerelease = build = ()
         if isinstance(components, STR_TYPE):
-            components = split_version(components)
+            components, prerelease, build = split_version(components, True)
         elif isinstance(components, list):
             components = tuple(components)
         padded = (components + (0, 0, 0))[:4]
         self.major, self.minor, self.micro, self.patch = padded
         self._resolution = len(components)
+        self.prerelease = prerelease
+        self.build = build
+        self.precedence = precedence_key(padded, prerelease)
 
     @property
     def components_full(self):
@@ -309,6 +1152,28 @@ class Version(object):
         """
         return self.major, self.minor, self.micro, self.patch
 
+    def freeze(self):
+        """Create an immutable copy of this version.
+
+        :rtype: `FrozenVersion`
+        :return: Immutable version, suitable for use as a `dict` key
+
+        """
+        return FrozenVersion.from_key(self.key, self.name, self.date)
+
+    @property
+    def key(self):
+        """Generate full length components, resolution and metadata.
+
+        This is the cheapest way to store a version for later use with
+        `Version.from_key`.
+
+        :rtype: `tuple`
+
+        """
+        return (self.major, self.minor, self.micro, self.patch,
+                self._resolution, self.prerelease, self.build)
+
     @property
     def components(self):
         """Generate component tuple to initial resolution.
@@ -322,6 +1187,8 @@ class Version(object):
     def bump(self, bump_type):
         """Bump a version string.
 
+        Pre-release and build metadata are cleared.
+
         :param str bump_type: Component to bump
 
         """
@@ -342,6 +1209,8 @@ class Version(object):
             self.patch += 1
         else:
             raise ValueError("Unknown bump_type %r" % bump_type)
+        self.prerelease = self.build = ()
+        self.precedence = self.components_full + (1, )
         self.date = datetime.date.today()
 
     def bump_major(self):
@@ -364,10 +1233,12 @@ class Version(object):
         """Generate a dotted version string.
 
         :rtype: `str`
-        :return: Standard dotted version string
+        :return: Standard dotted version string, including any pre-release
+            and build metadata
 
         """
-        return ".".join(str(s) for s in self.components)
+        return _dotted(self.components) + _semver_suffix(self.prerelease,
+                                                         self.build)
 
     def as_hex(self):
         """Generate a hex version string.
@@ -376,7 +1247,7 @@ class Version(object):
         :return: Version as hex string
 
         """
-        return "0x" + "".join("%02x" % n for n in self.components)
+        return _hex(self.components)
 
     def as_libtool(self):
         """Generate a libtool version string.
@@ -418,11 +1289,16 @@ class Version(object):
     def display_types():
         """Supported representation types.
 
+        This includes custom formats from `FORMATS` and plugins.
+
         :rtype: `list` of `str`
-        :return: Method names for representation types
+        :return: Names of representation types
 
         """
-        return [s[3:] for s in dir(Version) if s.startswith("as_")]
+        types = set(s[3:] for s in dir(Version) if s.startswith("as_"))
+        types.update(FORMATS)
+        types.update(_entry_points(FORMAT_ENTRY_POINT))
+        return sorted(types)
 
     def display(self, display_format):
         """Display a version string.
@@ -430,15 +1306,23 @@ class Version(object):
         :param str display_format: Format to display version string in
         :rtype: `str`
         :return: Formatted version string
+        :raise ValueError: Unknown display format
 
         """
-        return getattr(self, "as_%s" % display_format)()
+        method = getattr(self, "as_%s" % display_format, None)
+        if method:
+            return method()
+        return get_formatter(display_format)(self)
 
     @staticmethod
-    def read(filename):
+    def read(filename, file_type=None):
         """Read a version file.
 
+        Files with a reader in `READERS` are parsed from their structured
+        fields, falling back to searching for the magic line.
+
         :param str filename: Version file to read
+        :param str file_type: File type, guessed from the suffix if `None`
         :rtype: `Version`
         :return: New `Version` object representing file
         :raise OSError: When ``filename`` doesn't exist
@@ -446,29 +1330,126 @@ class Version(object):
 
         """
         data = open(filename).read().strip()
-        match = re.search(r"This is (%s),? [vV]ersion (%s) \((%s)\)"
-                          % (VALID_PACKAGE, VALID_VERSION, VALID_DATE),
-                          data)
-        if not match:
-            raise ValueError("No valid version identifier in %r" % filename)
-        name, version_str, date_str = match.groups()
-        components = split_version(version_str)
-        try:
-            parsed = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-        except ValueError:
-            parsed = datetime.datetime.strptime(date_str, "%d-%b-%Y")
-        return Version(components, name, parsed.date())
+        if file_type is None:
+            file_type = os.path.splitext(filename)[1][1:]
+        reader = READERS.get(file_type)
+        fields = reader(data) if reader else None
+        if not fields:
+            match = re.search(r"This is (%s),? [vV]ersion (%s) \((%s)\)"
+                              % (VALID_PACKAGE, VALID_VERSION, VALID_DATE),
+                              data)
+            if not match:
+                raise ValueError("No valid version identifier in %r"
+                                 % filename)
+            fields = match.groups()
+        name, version_str, date_str = fields
+        components, prerelease, build = split_version(version_str, True)
+        return Version.from_components_unchecked(components, name,
+                                                 parse_date(date_str),
+                                                 prerelease, build)
 
     def write(self, filename, file_type):
         """Write a version file.
 
+        The file is replaced atomically, so concurrent readers and writers
+        only ever see complete files.
+
         :param str filename: Version file to write
         :param str file_type: File type to write
         :rtype: `bool`
         :return: `True` on write success
 
         """
-        data = vars(self)
+        _replace_file(filename, self.render(file_type, filename))
+
+    def render(self, file_type, filename=None):
+        """Render a version file's content.
+
+        Rendering has no side effects, and is safe to call from multiple
+        threads.  Built-in file types are rendered from `NATIVE_TEMPLATES`,
+        unless the user has a template overriding them.
+
+        :param str file_type: File type to render
+        :param str filename: Version file the content is for, defaults to
+            ``version``
+        :rtype: `str`
+        :return: Rendered file content
+
+        """
+        if filename is None:
+            filename = "version"
+        if file_type in NATIVE_TEMPLATES \
+                and not self.template_index.find("%s.jinja" % file_type):
+            return self._render_native(filename, file_type)
+        return self._render_jinja(filename, file_type)
+
+    def _render_native(self, filename, file_type):
+        """Render a built-in file type without Jinja.
+
+        :param str filename: Version file the content is for
+        :param str file_type: File type to render
+        :rtype: `str`
+        :return: Rendered file content
+
+        """
+        components = self.components
+        dotted = self.as_dotted()
+        date = self.date.isoformat()
+        return NATIVE_TEMPLATES[file_type] % {
+            'magic': 'This is %s version %s (%s)' % (self.name, dotted, date),
+            'dotted': dotted,
+            'hex': _hex(components),
+            'libtool': _libtool(components),
+            'date': date,
+            'tuple': str(components),
+            'web': "%s/%s" % (self.name, dotted),
+            'escaped_name': _NON_UPPER.sub("_", filename.upper()),
+            'capitalized_name': self.name.capitalize(),
+        }
+
+    def _render_jinja(self, filename, file_type):
+        """Render a version file's content from its template.
+
+        Output is stored in `Version.render_cache`, unless it is `None` or
+        the template uses the current time.
+
+        :param str filename: Version file the content is for
+        :param str file_type: File type to render
+        :rtype: `str`
+        :return: Rendered file content
+
+        """
+        template = self.env.get_template("%s.jinja" % file_type)
+        data = self._base_context(filename)
+        cache = self.render_cache
+        info = _template_info(self.env, template) if cache else None
+        if not info or "now" in info[1] or "utcnow" in info[1]:
+            return template.render(self._full_context(data))
+        digest, names = info
+        # Only the referenced values are computed for the key, as display
+        # methods are comparatively expensive
+        values = []
+        for name in names:
+            method = getattr(self, "as_%s" % name, None)
+            values.append((name, method() if method else data.get(name)))
+        key = hashlib.sha1(digest)
+        key.update(repr(values).encode("utf-8"))
+        key = key.hexdigest()
+        output = cache.get(key)
+        if output is None:
+            output = template.render(self._full_context(data))
+            cache.put(key, output)
+        return output
+
+    def _base_context(self, filename):
+        """Build template context, without display method output.
+
+        :param str filename: Version file the content is for
+        :rtype: `dict`
+        :return: Template variables
+
+        """
+        data = dict(vars(self))
         data.update({
             'now': datetime.datetime.now(),
             'utcnow': datetime.datetime.utcnow(),
@@ -481,26 +1462,2325 @@ class Version(object):
         })
         data.update(dict(zip(["major", "minor", "micro", "patch"],
                              self.components)))
+        return data
+
+    def _full_context(self, data):
+        """Add display method output to template context.
+
+        :param dict data: Context from `Version._base_context`
+        :rtype: `dict`
+        :return: Template variables
+
+        """
         data.update(dict([(k[3:], getattr(self, k)())
                           for k in dir(self) if k.startswith("as_")]))
+        return data
 
-        template = self.env.get_template("%s.jinja" % file_type)
-        open(filename, "w").write(template.render(data))
+    @classmethod
+    def template_path(cls, file_type):
+        """Locate the template used to write a file type.
 
+        :param str file_type: File type to locate template for
+        :rtype: `str`
+        :return: Path of the template chosen by `Version.env`'s loaders, or
+            `None` for templates without a file
 
-def split_version(version):
-    """Split version string to components.
+        """
+        return cls.env.get_template("%s.jinja" % file_type).filename
 
-    :param str version: Version string
-    :rtype: `tuple` of `int`
-    :return: Components of version string
+
+class FileLock(object):
+
+    """Advisory lock for a version file.
+
+    The lock is held on a ``.lock`` file alongside the version file, as the
+    version file itself may not exist yet and is replaced when written.  The
+    lock file is removed on release, so it only exists while versionah is
+    running.  Locking is a no-op on systems without :mod:`fcntl`.
+
+    """
+
+    def __init__(self, filename):
+        """Initialise a new `FileLock` object.
+
+        :param str filename: Version file to lock
+
+        """
+        self.filename = os.path.realpath(filename) + ".lock"
+        self._file = None
+
+    def acquire(self):
+        """Acquire the lock, blocking until it is available."""
+        while fcntl and not self._file:
+            lock = open(self.filename, "a")
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            # The previous holder may have removed the file while we waited,
+            # in which case the lock must be taken on the new file
+            try:
+                current = os.stat(self.filename)
+            except OSError:
+                current = None
+            if current and os.path.samestat(current, os.fstat(lock.fileno())):
+                self._file = lock
+            else:
+                lock.close()
+
+    def release(self):
+        """Release the lock, if held."""
+        if self._file:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class InternedVersion(Version):
+
+    """Immutable `Version`, as returned by `Version.intern`."""
+
+    def __init__(self, components=(0, 1, 0), name="unknown", date=None):
+        """Initialise a new `InternedVersion` object.
+
+        See `Version.__init__`.
+
+        """
+        super(InternedVersion, self).__init__(components, name, date)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        """Block attribute changes after initialisation.
+
+        :raise AttributeError: Object is already initialised
+
+        """
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Interned Version objects are immutable")
+        super(InternedVersion, self).__setattr__(name, value)
+
+
+class FrozenVersion(object):
+
+    """Immutable version value, as returned by `Version.freeze`.
+
+    Unlike `Version` objects, these are hashed by their precedence so 0.1 and
+    0.1.0 are equal keys.  The hash and precedence are computed only once.
+
+    """
+
+    __slots__ = ("components_full", "_resolution", "prerelease", "build",
+                 "precedence", "name", "date", "_hash")
+
+    def __init__(self, components=(0, 1, 0), name="unknown", date=None):
+        """Initialise a new `FrozenVersion` object.
+
+        See `Version.__init__`.
+
+        """
+        version = Version(components, name, date)
+        self._setup(version.key, version.name, version.date)
+
+    def _setup(self, key, name, date):
+        """Set attributes, bypassing immutability.
+
+        :param tuple key: Full components and resolution, optionally followed
+            by pre-release and build metadata identifiers
+        :param str name: Package name
+        :param datetime.date date: Date associated with version
+
+        """
+        full = tuple(key[:4])
+        prerelease, build = key[5:] or ((), ())
+        precedence = precedence_key(full, prerelease)
+        set_slot = object.__setattr__
+        set_slot(self, "components_full", full)
+        set_slot(self, "_resolution", key[4])
+        set_slot(self, "prerelease", prerelease)
+        set_slot(self, "build", build)
+        set_slot(self, "precedence", precedence)
+        set_slot(self, "name", name)
+        set_slot(self, "date", date)
+        set_slot(self, "_hash", hash(precedence))
+
+    @classmethod
+    def from_key(cls, key, name="unknown", date=None):
+        """Create a `FrozenVersion` from a trusted `Version.key`.
+
+        See `Version.from_key`.
+
+        :rtype: `FrozenVersion`
+        :return: New version object
+
+        """
+        version = cls.__new__(cls)
+        version._setup(key, name,
+                       datetime.date.today() if date is None else date)
+        return version
+
+    def thaw(self):
+        """Create a mutable copy of this version.
+
+        :rtype: `Version`
+        :return: Mutable version
+
+        """
+        return Version.from_key(self.key, self.name, self.date)
+
+    def __setattr__(self, name, value):
+        """Block attribute changes.
+
+        :raise AttributeError: Always
+
+        """
+        raise AttributeError("FrozenVersion objects are immutable")
+
+    def __reduce__(self):
+        """Support pickling, as attributes can't be set by `pickle`.
+
+        :rtype: `tuple`
+
+        """
+        return (self.__class__.from_key, (self.key, self.name, self.date))
+
+    @property
+    def components(self):
+        """Component tuple to initial resolution, see `Version.components`.
+
+        :rtype: `tuple` of `int`
+
+        """
+        return self.components_full[:self._resolution]
+
+    @property
+    def key(self):
+        """Full length components, resolution and metadata, see `Version.key`.
+
+        :rtype: `tuple`
+
+        """
+        return self.components_full + (self._resolution, self.prerelease,
+                                       self.build)
+
+    def __repr__(self):
+        """Self-documenting string representation.
+
+        :rtype: `str`
+        :return: String representation of object
+
+        """
+        if self.prerelease or self.build:
+            components = self.as_dotted()
+        else:
+            components = self.components
+        return "%s(%r, %r, %r)" % (self.__class__.__name__, components,
+                                   self.name, self.date)
+
+    def __str__(self):
+        """Return default string representation, see `Version.__str__`.
+
+        :rtype: `str`
+
+        """
+        return "%s v%s" % (self.name, self.as_dotted())
+
+    def as_dotted(self):
+        """Generate a dotted version string, see `Version.as_dotted`.
+
+        :rtype: `str`
+
+        """
+        return _dotted(self.components) + _semver_suffix(self.prerelease,
+                                                         self.build)
+
+    def __hash__(self):
+        """Fetch hash of padded components.
+
+        :rtype: `int`
+
+        """
+        return self._hash
+
+    def __eq__(self, other):
+        """Test for equality with padded components, see `Version.__eq__`.
+
+        :rtype: `bool`
+
+        """
+        return self.precedence == Version._prepare_cmp_object(other)
+
+    def __ne__(self, other):
+        """Test for inequality, see `FrozenVersion.__eq__`.
+
+        :rtype: `bool`
+
+        """
+        return not self == other
+
+    def __lt__(self, other):
+        """Strict less-than test against comparable object.
+
+        :rtype: `bool`
+
+        """
+        return self.precedence < Version._prepare_cmp_object(other)
+
+    def __gt__(self, other):
+        """Strict greater-than test against comparable object.
+
+        :rtype: `bool`
+
+        """
+        return self.precedence > Version._prepare_cmp_object(other)
+
+    def __le__(self, other):
+        """Less-than or equal to test against comparable object.
+
+        :rtype: `bool`
+
+        """
+        return self.precedence <= Version._prepare_cmp_object(other)
+
+    def __ge__(self, other):
+        """Greater-than or equal to test against comparable object.
+
+        :rtype: `bool`
+
+        """
+        return self.precedence >= Version._prepare_cmp_object(other)
+
+
+def split_version(version, metadata=False):
+    """Split version string to components.
+
+    :param str version: Version string
+    :param bool metadata: Also return pre-release and build metadata
+    :rtype: `tuple` of `int`
+    :return: Components of version string, or if ``metadata`` is `True`
+        a tuple of components, pre-release identifiers and build metadata
+        identifiers
+    :raise ValueError: Invalid version string
+
+    """
+    if not re.match("%s$" % VALID_VERSION, version):
+        raise ValueError("Invalid version string %r" % version)
+
+    version, _, build = version.partition("+")
+    version, _, prerelease = version.partition("-")
+    components = tuple(int(s) for s in version.split("."))
+    if not metadata:
+        return components
+    return (components, tuple(prerelease.split(".")) if prerelease else (),
+            tuple(build.split(".")) if build else ())
+
+
+def _semver_suffix(prerelease, build):
+    """Format pre-release and build metadata for a version string.
+
+    :param tuple prerelease: Pre-release identifiers
+    :param tuple build: Build metadata identifiers
+    :rtype: `str`
+    :return: Version string suffix
+
+    """
+    suffix = ""
+    if prerelease:
+        suffix += "-" + ".".join(prerelease)
+    if build:
+        suffix += "+" + ".".join(build)
+    return suffix
+
+
+def precedence_key(components, prerelease=(), reverse=False):
+    """Generate a key ordering versions by SemVer precedence.
+
+    Keys are flat tuples of `int` for releases, so sorting releases is as
+    fast as sorting their components.  Pre-release identifiers follow
+    a marker that orders them before the matching release.  Numeric
+    identifiers compare numerically, and before alphanumeric identifiers.
+
+    :param tuple components: Full length version components
+    :param tuple prerelease: Pre-release identifiers
+    :param bool reverse: Generate key for descending order
+    :rtype: `tuple`
+    :return: Key for version
+
+    """
+    if not reverse:
+        if not prerelease:
+            return tuple(components) + (1, )
+        return tuple(components) + (0, ) + tuple(
+            (0, int(s)) if s.isdigit() else (1, s) for s in prerelease)
+    key = tuple(-n for n in components)
+    if not prerelease:
+        return key + (-1, )
+    # Strings can't be negated, so their code points are.  The trailing
+    # markers make shorter identifiers, and shorter lists, sort later
+    return key + (0, ) + tuple(
+        (1, -int(s)) if s.isdigit() else (0, tuple(-ord(c) for c in s) + (1, ))
+        for s in prerelease) + ((2, ), )
+
+
+#: Pre-formatted strings for small integers, used by the bulk formatters
+_INT_STRINGS = dict((n, str(n)) for n in range(1024))
+#: Pre-formatted two digit hex strings for byte values
+_HEX_BYTES = dict((n, "%02x" % n) for n in range(256))
+
+
+def _bulk_format(components, formatter):
+    """Apply a formatter to many component tuples.
+
+    Each distinct tuple is only formatted once.
+
+    :param components: Version components to format
+    :type components: iterable of sequences of `int`
+    :param formatter: Function to format a single `tuple` of components
+    :rtype: `list` of `str`
+    :return: Formatted versions
+
+    """
+    cache = {}
+    strings = []
+    for parts in components:
+        parts = tuple(parts)
+        try:
+            string = cache[parts]
+        except KeyError:
+            string = cache[parts] = formatter(parts)
+        strings.append(string)
+    return strings
+
+
+def _dotted(parts):
+    """Format components as dotted string, see `Version.as_dotted`."""
+    ints = _INT_STRINGS
+    try:
+        return ".".join([ints[n] for n in parts])
+    except KeyError:
+        return ".".join([str(n) for n in parts])
+
+
+def _hex(parts):
+    """Format components as hex string, see `Version.as_hex`."""
+    table = _HEX_BYTES
+    try:
+        return "0x" + "".join([table[n] for n in parts])
+    except KeyError:
+        return "0x" + "".join(["%02x" % n for n in parts])
+
+
+def _libtool(parts):
+    """Format components as libtool string, see `Version.as_libtool`."""
+    parts = tuple(parts) + (0, 0)
+    return "%i:%i" % (parts[0] * 10 + parts[1], 20 + parts[2])
+
+
+def format_dotted(components):
+    """Generate dotted version strings for many versions.
+
+    :param components: Version components to format
+    :type components: iterable of sequences of `int`
+    :rtype: `list` of `str`
+    :return: Dotted version strings
+
+    """
+    return _bulk_format(components, _dotted)
+
+
+def format_hex(components):
+    """Generate hex version strings for many versions.
+
+    :param components: Version components to format
+    :type components: iterable of sequences of `int`
+    :rtype: `list` of `str`
+    :return: Hex version strings
+
+    """
+    return _bulk_format(components, _hex)
+
+
+def format_libtool(components):
+    """Generate libtool version strings for many versions.
+
+    :param components: Version components to format
+    :type components: iterable of sequences of `int`
+    :rtype: `list` of `str`
+    :return: Libtool version strings
+
+    """
+    return _bulk_format(components, _libtool)
+
+
+#: Month abbreviations for shtool's ``%d-%b-%Y`` date format.  These are
+#: fixed, unlike :func:`~datetime.datetime.strptime`'s locale dependent ``%b``
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep",
+          "Oct", "Nov", "Dec")
+_MONTH_NUMBERS = dict((month, n) for n, month in enumerate(MONTHS, 1))
+
+
+def parse_date(string):
+    """Parse a version date string.
+
+    Both ISO-8601 and shtool's ``%d-%b-%Y`` formats are supported, see
+    `VALID_DATE`.
+
+    :param str string: Date string
+    :rtype: `datetime.date`
+    :return: Date represented by ``string``
+    :raise ValueError: Invalid date string
+
+    """
+    # int() also accepts signs, whitespace and underscores, so fields are
+    # checked to be plain digits first
+    try:
+        if len(string) == 10 and string[4] == "-" and string[7] == "-":
+            year, month, day = string[:4], string[5:7], string[8:]
+            if year.isdigit() and month.isdigit() and day.isdigit():
+                return datetime.date(int(year), int(month), int(day))
+        elif len(string) == 11 and string[2] == "-" and string[6] == "-":
+            year, day = string[7:], string[:2]
+            if year.isdigit() and day.isdigit():
+                return datetime.date(int(year), _MONTH_NUMBERS[string[3:6]],
+                                     int(day))
+    except (KeyError, ValueError):
+        pass
+    raise ValueError("Invalid date string %r" % string)
+
+
+def parse_dates(strings):
+    """Parse many version date strings.
+
+    Identical strings are only parsed once, which makes a large difference
+    for bulk data where most entries share a handful of release dates.
+
+    :param strings: Date strings to parse
+    :type strings: iterable of `str`
+    :rtype: `list` of `datetime.date`
+    :return: Dates represented by ``strings``
+    :raise ValueError: Invalid date string
+
+    """
+    cache = {}
+    dates = []
+    for string in strings:
+        try:
+            date = cache[string]
+        except KeyError:
+            date = cache[string] = parse_date(string)
+        dates.append(date)
+    return dates
+
+
+def parse_record(line):
+    """Parse a version record.
+
+    Records are either a bare version string, or a whitespace separated
+    ``name version date`` triple.
+
+    :param str line: Record to parse
+    :rtype: `Version`
+    :return: Version described by ``line``
+    :raise ValueError: Invalid record
+
+    """
+    fields = line.split()
+    if len(fields) == 1:
+        components, prerelease, build = split_version(fields[0], True)
+        return Version.from_components_unchecked(components, "unknown", None,
+                                                 prerelease, build)
+    elif len(fields) == 3:
+        name, version, date = fields
+        if re.match("%s$" % VALID_PACKAGE, name):
+            components, prerelease, build = split_version(version, True)
+            return Version.from_components_unchecked(components, name,
+                                                     parse_date(date),
+                                                     prerelease, build)
+    raise ValueError("Invalid record %r" % line.strip())
+
+
+def filter_stream(stream, output, display_format, invalid="report",
+                  errors=sys.stderr, buffer_lines=1024):
+    """Reformat a stream of version records.
+
+    Records are processed a line at a time, and output is written in blocks
+    of ``buffer_lines``, so arbitrarily large inputs can be handled.
+
+    :param file stream: Records to read, see :func:`parse_record`
+    :param file output: Stream to write formatted versions to
+    :param str display_format: Format to display versions in
+    :param str invalid: Either ``report`` to write invalid records to
+        ``errors``, or ``pass`` to copy them to ``output``
+    :param file errors: Stream to report invalid records to
+    :param int buffer_lines: Number of lines to buffer before writing
+    :rtype: `int`
+    :return: Number of invalid records
+
+    """
+    count = 0
+    lines = []
+    for number, line in enumerate(stream, 1):
+        try:
+            lines.append(str(parse_record(line).display(display_format)))
+        except ValueError as error:
+            count += 1
+            if invalid == "pass":
+                lines.append(line.rstrip("\n"))
+            else:
+                errors.write("%d: %s\n" % (number, error.args[0]))
+        if len(lines) >= buffer_lines:
+            output.write("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        output.write("\n".join(lines) + "\n")
+    return count
+
+
+def _checked_fields(web, dotted, date):
+    """Validate fields read from a structured version file.
+
+    :param str web: Version in web UA-style, see `Version.as_web`
+    :param str dotted: Dotted version string
+    :param str date: Release date string
+    :rtype: `tuple` of `str`
+    :return: Package name, version and date strings, or `None` if they are
+        invalid
+
+    """
+    name = web.rpartition("/")[0]
+    if re.match("%s$" % VALID_PACKAGE, name) \
+            and re.match("%s$" % VALID_VERSION, dotted) \
+            and re.match("%s$" % VALID_DATE, date):
+        return name, dotted, date
+
+
+def read_json(data):
+    """Read version fields from ``json`` file content.
+
+    :param str data: File content
+    :rtype: `tuple` of `str`
+    :return: Package name, version and date strings, or `None` if they can't
+        be found
+
+    """
+    try:
+        fields = json.loads(data)
+        return _checked_fields(fields["web"], fields["dotted"],
+                               fields["date"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+_PY_FIELD = re.compile(r"""(dotted|date|web)\s*=\s*(["'])(.*)\2\s*$""")
+
+
+def read_py(data):
+    """Read version fields from ``py`` file content.
+
+    Only simple string assignments are recognised, the file is not parsed or
+    executed.
+
+    :param str data: File content
+    :rtype: `tuple` of `str`
+    :return: Package name, version and date strings, or `None` if they can't
+        be found
+
+    """
+    fields = {}
+    for line in data.splitlines():
+        match = _PY_FIELD.match(line)
+        if match:
+            fields[match.group(1)] = match.group(3)
+    try:
+        return _checked_fields(fields["web"], fields["dotted"],
+                               fields["date"])
+    except KeyError:
+        return None
+
+#: Readers for structured file types, mapping file types to functions taking
+#: file content and returning package name, version and date strings
+READERS = {
+    "json": read_json,
+    "py": read_py,
+}
+
+
+def guess_type(filename):
+    """Guess file type from a filename's suffix.
+
+    :param str filename: Filename to guess type for
+    :rtype: `str`
+    :return: Matching file type, or ``text`` if there is no match
+
+    """
+    suffix = os.path.splitext(filename)[1][1:]
+    if suffix and is_filetype(suffix):
+        return suffix
+    else:
+        return "text"
+
+
+def parse_output(string):
+    """Split an output specification in to filename and file type.
+
+    The format is ``filename:type``, if ``:type`` is omitted the type is
+    guessed from the filename.
+
+    :param str string: Output specification
+    :rtype: `tuple` of `str`
+    :return: Filename and file type
+    :raise ValueError: Unknown file type
+
+    """
+    filename, _, file_type = string.rpartition(":")
+    if not filename:
+        return string, guess_type(string)
+    elif not is_filetype(file_type):
+        raise ValueError("Invalid file type %r for output %r"
+                         % (file_type, filename))
+    return filename, file_type
+
+
+def write_outputs(source, outputs):
+    """Regenerate output files from a version file.
+
+    :param str source: Version file to read
+    :param list outputs: Filename and file type pairs to write
+
+    """
+    version = Version.read(source)
+    for filename, file_type in outputs:
+        version.write(filename, file_type)
+
+
+def escape_make(path):
+    """Escape a path for use in a Makefile rule.
+
+    :param str path: Path to escape
+    :rtype: `str`
+    :return: Path escaped for :program:`make` and :program:`ninja`
+
+    """
+    return re.sub(r"([ #])", r"\\\1", path).replace("$", "$$")
+
+
+def write_depfile(filename, rules):
+    """Write a Makefile style dependency file.
+
+    :param str filename: Dependency file to write
+    :param list rules: Target and dependency list pairs
+
+    """
+    lines = []
+    for target, dependencies in rules:
+        lines.append("%s: %s\n" % (escape_make(target),
+                                   " ".join(escape_make(s)
+                                            for s in dependencies)))
+    open(filename, "w").write("".join(lines))
+
+
+def template_files():
+    """Find user templates that may override the bundled templates.
+
+    :rtype: `list` of `str`
+    :return: Paths of templates in `Version.pkg_data_dirs`
+
+    """
+    files = []
+    for directory in Version.pkg_data_dirs:
+        files.extend(os.path.join(directory, name)
+                     for name in Version.template_index.entries(directory)[1]
+                     if name.endswith(".jinja"))
+    return files
+
+
+def affected_outputs(changed, source, outputs):
+    """Filter outputs to those requiring regeneration.
+
+    Changes to the version file affect every output, whereas template
+    changes only affect outputs of the template's file type.
+
+    :param set changed: Paths that have changed
+    :param str source: Version file
+    :param list outputs: Filename and file type pairs
+    :rtype: `list`
+    :return: Outputs that must be rewritten
+
+    """
+    if os.path.abspath(source) in changed:
+        return list(outputs)
+    types = set(os.path.basename(path)[:-6] for path in changed
+                if path.endswith(".jinja"))
+    return [output for output in outputs if output[1] in types]
+
+
+def _snapshot(source):
+    """Record modification state for watched files.
+
+    :param str source: Version file
+    :rtype: `dict`
+    :return: Map of paths to modification time and size
+
+    """
+    state = {}
+    for path in [source, ] + template_files():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        state[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+    return state
+
+
+def _poll_changes(source, interval, delay):
+    """Generate sets of changed paths by polling.
+
+    :param str source: Version file
+    :param float interval: Time between checks
+    :param float delay: Quiet time required before reporting changes
+    :rtype: generator of `set`
+
+    """
+    previous = _snapshot(source)
+    while True:
+        time.sleep(interval)
+        current = _snapshot(source)
+        if current == previous:
+            continue
+        # Wait for changes to settle, editors often save in several steps
+        while True:
+            time.sleep(delay)
+            latest = _snapshot(source)
+            if latest == current:
+                break
+            current = latest
+        changed = set(path for path in set(previous) | set(current)
+                      if previous.get(path) != current.get(path))
+        previous = current
+        yield changed
+
+
+def _inotify_changes(source, delay):
+    """Generate sets of changed paths using inotify.
+
+    :param str source: Version file
+    :param float delay: Quiet time required before reporting changes
+    :rtype: generator of `set`
+
+    """
+    import pyinotify
+
+    source = os.path.abspath(source)
+    changed = set()
+
+    class Handler(pyinotify.ProcessEvent):
+        def process_default(self, event):
+            changed.add(event.pathname)
+
+    manager = pyinotify.WatchManager()
+    mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO \
+        | pyinotify.IN_CREATE | pyinotify.IN_DELETE
+    for directory in [os.path.dirname(source), ] + Version.pkg_data_dirs:
+        if os.path.isdir(directory):
+            manager.add_watch(directory, mask)
+    notifier = pyinotify.Notifier(manager, Handler())
+    while True:
+        if not notifier.check_events(None):
+            continue
+        # Keep draining until events stop arriving for delay seconds
+        while True:
+            notifier.read_events()
+            notifier.process_events()
+            if not notifier.check_events(delay * 1000):
+                break
+        interesting = set(path for path in changed
+                          if path == source or path.endswith(".jinja"))
+        changed.clear()
+        if interesting:
+            yield interesting
+
+
+def watch(source, outputs, interval=1, delay=0.2):
+    """Regenerate outputs whenever their inputs change.
+
+    inotify is used if :mod:`pyinotify` is available, otherwise the files
+    are polled every ``interval`` seconds.  This function only returns when
+    interrupted.
+
+    :param str source: Version file to watch
+    :param list outputs: Filename and file type pairs to write
+    :param float interval: Time between checks when polling
+    :param float delay: Quiet time required before regenerating
+
+    """
+    # pyinotify is slow to import, so only watch mode pays for it
+    try:
+        import pyinotify  # NOQA
+    except ImportError:
+        changes = _poll_changes(source, interval, delay)
+    else:
+        changes = _inotify_changes(source, delay)
+    for changed in itertools.chain([None, ], changes):
+        if changed is None:
+            targets = outputs
+        else:
+            targets = affected_outputs(changed, source, outputs)
+        if not targets:
+            continue
+        try:
+            write_outputs(source, targets)
+        except (IOError, ValueError) as error:
+            print(fail(str(error)))
+        else:
+            print(success("Regenerated %s"
+                          % ", ".join(output[0] for output in targets)))
+
+
+class History(object):
+
+    """Store of version changes, backed by SQLite.
+
+    The database is opened in WAL mode, so readers don't block concurrent
+    :program:`versionah` calls recording changes.
+
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            package TEXT NOT NULL,
+            action TEXT NOT NULL,
+            old TEXT,
+            new TEXT NOT NULL,
+            date TEXT NOT NULL,
+            path TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS events_package ON events (package, id);
+        CREATE INDEX IF NOT EXISTS events_date ON events (date, id);
+        CREATE TABLE IF NOT EXISTS latest (
+            package TEXT PRIMARY KEY,
+            id INTEGER NOT NULL REFERENCES events (id)
+        );
+    """
+    #: Columns returned by queries
+    COLUMNS = "package, action, old, new, date, path"
+
+    def __init__(self, filename):
+        """Open a history database, creating it if necessary.
+
+        :param str filename: Database file
+
+        """
+        self._db = sqlite3.connect(filename)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+
+    def record(self, action, path, old, new):
+        """Record a version change.
+
+        :param str action: Type of change, such as ``bump`` or ``set``
+        :param str path: Version file that was changed
+        :param old: Previous version, if any
+        :type old: `Version` or `None`
+        :param Version new: New version
+
+        """
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO events (package, action, old, new, date, path) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (new.name, action, old.as_dotted() if old else None,
+                 new.as_dotted(), new.as_date(), os.path.abspath(path)))
+            self._db.execute("INSERT OR REPLACE INTO latest VALUES (?, ?)",
+                             (new.name, cursor.lastrowid))
+
+    def _query(self, where, args=()):
+        """Fetch events.
+
+        :param str where: SQL condition for events
+        :param tuple args: Parameters for ``where``
+        :rtype: `list` of `tuple`
+        :return: Matching events, see `History.COLUMNS`
+
+        """
+        return self._db.execute("SELECT %s FROM events WHERE %s ORDER BY id"
+                                % (self.COLUMNS, where), args).fetchall()
+
+    def package(self, name):
+        """Fetch history for a package.
+
+        :param str name: Package name
+        :rtype: `list` of `tuple`
+        :return: Events, oldest first
+
+        """
+        return self._query("package = ?", (name, ))
+
+    def on_date(self, date):
+        """Fetch all changes to versions dated ``date``.
+
+        :param datetime.date date: Date to search for
+        :rtype: `list` of `tuple`
+        :return: Events, oldest first
+
+        """
+        return self._query("date = ?", (date.isoformat(), ))
+
+    def latest(self):
+        """Fetch most recent change for each package.
+
+        :rtype: `list` of `tuple`
+        :return: Events, oldest first
+
+        """
+        return self._query("id IN (SELECT id FROM latest)")
+
+    def close(self):
+        """Close database."""
+        self._db.close()
+
+
+def _replace_file(filename, data):
+    """Atomically replace a file.
+
+    Symbolic links are followed, so that the link target is replaced.  The
+    content is written to a temporary file alongside the target, which is then
+    renamed over it.  The mode of an existing file is kept.
+
+    A rename would detach files with multiple hard links or another owner, and
+    can't replace files on Windows with Python 2, so those files are rewritten
+    in place instead.  Callers hold a `FileLock` for version files, so this is
+    still safe against concurrent versionah runs.
+
+    :param str filename: File to write
+    :param str data: Content to write
+
+    """
+    filename = os.path.realpath(filename)
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        stat = None
+    if _rewrite_in_place(stat):
+        output = open(filename, "w")
+        try:
+            output.write(data)
+        finally:
+            output.close()
+        return
+    temp = "%s.versionah-%d-%d" % (filename, os.getpid(),
+                                   threading.current_thread().ident)
+    try:
+        output = os.fdopen(os.open(temp, os.O_WRONLY | os.O_CREAT
+                                   | os.O_EXCL, 0o666), "w")
+        try:
+            output.write(data)
+        finally:
+            output.close()
+        if stat:
+            shutil.copymode(filename, temp)
+        _RENAME(temp, filename)
+    finally:
+        if os.path.exists(temp):
+            os.unlink(temp)
+
+
+def _rewrite_in_place(stat):
+    """Check whether a file must be rewritten in place, see `_replace_file`.
+
+    :param stat: Result of `os.stat` for the file, or `None` if it doesn't
+        exist
+    :rtype: `bool`
+
+    """
+    if not _RENAME:
+        return True
+    return bool(stat) and (stat.st_nlink > 1 or _foreign_owner(stat))
+
+
+def _move_file(source, target, in_place):
+    """Move a file over another.
+
+    :param str source: File to move
+    :param str target: File to replace
+    :param bool in_place: Copy the content in to ``target``, keeping its
+        links and ownership, instead of renaming ``source`` over it
+
+    """
+    if in_place:
+        shutil.copyfile(source, target)
+        os.remove(source)
+    else:
+        _RENAME(source, target)
+
+
+def _foreign_owner(stat):
+    """Check whether a file has a different owner to new files.
+
+    :param stat: Result of `os.stat` for the file
+    :rtype: `bool`
+
+    """
+    if not hasattr(os, "geteuid"):
+        return False
+    return (stat.st_uid, stat.st_gid) != (os.geteuid(), os.getegid())
+
+
+def _write_durably(filename, data):
+    """Write a file, and flush it to disk.
+
+    :param str filename: File to write
+    :param str data: Content to write
+
+    """
+    output = open(filename, "w")
+    try:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    finally:
+        output.close()
+
+
+def _stage(filename, file_type, bump_type, components, expect=None):
+    """Prepare a version file update for a transaction.
+
+    :param str filename: Version file to update
+    :param str file_type: File type to write
+    :param str bump_type: Component to bump, if any
+    :type components: `str` or `tuple` of `int`
+    :param components: Components to set, if not bumping
+    :param str expect: Version the file must contain before it is changed
+    :rtype: `tuple`
+    :return: Target, staged and backup filenames, whether the target is
+        rewritten in place, and new and old `Version`
+    :raise IOError: File doesn't contain ``expect``, with ``errno.EAGAIN``
+
+    """
+    filename = os.path.realpath(filename)
+    try:
+        version = Version.read(filename, file_type)
+        old = Version.from_key(version.key, version.name, version.date)
+    except IOError:
+        if bump_type:
+            raise
+        version = Version()
+        old = None
+    if expect and not version == expect:
+        raise IOError(errno.EAGAIN,
+                      "Version changed in %r, expected %s but found %s"
+                      % (filename, expect, version.as_dotted()))
+    if bump_type:
+        version.bump(bump_type)
+    else:
+        version.set(components)
+    staged = filename + ".versionah-new"
+    _write_durably(staged, version.render(file_type, filename))
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        stat = None
+    in_place = _rewrite_in_place(stat)
+    if stat:
+        shutil.copymode(filename, staged)
+        backup = filename + ".versionah-old"
+        if os.path.exists(backup):
+            os.remove(backup)
+        # Files rewritten in place need a real copy, as a link would change
+        # along with the file
+        if in_place or not hasattr(os, "link"):
+            shutil.copy2(filename, backup)
+        else:
+            try:
+                os.link(filename, backup)
+            except OSError:
+                shutil.copy2(filename, backup)
+    else:
+        backup = None
+    return filename, staged, backup, in_place, version, old
+
+
+def _read_journal(journal):
+    """Read a transaction journal.
+
+    :param str journal: Journal file
+    :rtype: `list` of `tuple`
+    :return: Target, staged and backup filenames, and whether the target is
+        rewritten in place, for each file
+    :raise IOError: When ``journal`` doesn't exist
+    :raise ValueError: Invalid journal
+
+    """
+    try:
+        entries = [tuple(entry)
+                   for entry in json.load(open(journal))["entries"]]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid journal %r" % journal)
+    if not all(len(entry) == 4 for entry in entries):
+        raise ValueError("Invalid journal %r" % journal)
+    return entries
+
+
+def _finish_transaction(journal, entries):
+    """Remove a completed transaction's backups and journal.
+
+    :param str journal: Journal file
+    :param list entries: Transaction entries, see :func:`_read_journal`
+
+    """
+    for _, staged, backup, _ in entries:
+        for leftover in (staged, backup):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+    os.remove(journal)
+
+
+def update_files(files, journal, bump_type=None, components=None,
+                 threads=None, history=None, expect=None):
+    """Bump or set several version files as a single transaction.
+
+    New content for every file is rendered first, in parallel, alongside
+    the original files.  The pending renames are then recorded in
+    ``journal``, and finally all the files are renamed in to place.  If this
+    is interrupted :func:`recover` can complete or revert the transaction.
+
+    :param list files: Filename and file type pairs to update, optionally
+        with a third element giving a component to bump for that file
+    :param str journal: Journal file to use
+    :param str bump_type: Component to bump, for files without their own
+    :param components: Components to set, if not bumping
+    :type components: `str` or `tuple` of `int`
+    :param int threads: Number of rendering threads, defaults to CPU count
+    :param History history: History store to record changes in
+    :param str expect: Version every file must contain before the
+        transaction, checked while the files are locked
+    :rtype: `list` of `Version`
+    :return: New versions for each file
+    :raise IOError: Unfinished transaction in ``journal``, or a file doesn't
+        contain ``expect`` with ``errno.EAGAIN``
+    :raise ValueError: A version file is given more than once
+
+    """
+    if os.path.exists(journal):
+        raise IOError(errno.EEXIST, "Unfinished transaction in %r" % journal)
+    files = [(entry[0], entry[1], entry[2] if len(entry) > 2 else bump_type)
+             for entry in files]
+    seen = set()
+    for filename, _, _ in files:
+        path = os.path.realpath(filename)
+        if path in seen:
+            raise ValueError("Duplicate version file %r" % filename)
+        seen.add(path)
+    locks = sorted([FileLock(f[0]) for f in files],
+                   key=lambda lock: lock.filename)
+    for lock in locks:
+        lock.acquire()
+    try:
+        pool = ThreadPool(threads)
+        results = []
+        try:
+            for filename, file_type, file_bump in files:
+                results.append(pool.apply_async(_stage,
+                                                (filename, file_type,
+                                                 file_bump, components,
+                                                 expect)))
+            pool.close()
+            staged = [result.get() for result in results]
+        except Exception:
+            pool.join()
+            for result in results:
+                if result.ready() and result.successful():
+                    _, new, backup = result.get()[:3]
+                    for leftover in (new, backup):
+                        if leftover:
+                            os.remove(leftover)
+            raise
+        pool.join()
+        entries = [entry[:4] for entry in staged]
+
+        _write_durably(journal + ".tmp", json.dumps({"entries": entries}))
+        os.rename(journal + ".tmp", journal)
+        for target, new, _, in_place in entries:
+            _move_file(new, target, in_place)
+        _finish_transaction(journal, entries)
+        if history:
+            for (target, _, _, _, version, old), (_, _, file_bump) \
+                    in zip(staged, files):
+                history.record("bump" if file_bump else "set", target, old,
+                               version)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+    return [entry[4] for entry in staged]
+
+
+#: Bump applied to dependents in a workspace, by version resolution
+CASCADE_BUMPS = {2: "minor", 3: "micro", 4: "patch"}
+
+
+class Workspace(object):
+
+    """Related version files, with dependencies between their packages.
+
+    Manifests are INI files with a section for each package.  The ``file``
+    option gives the package's version file, and optional ``type``,
+    ``outputs`` and ``depends`` options give its file type, whitespace
+    separated ``filename:type`` output specifications and the packages it
+    depends on.  Paths are relative to the manifest.
+
+    """
+
+    def __init__(self, packages):
+        """Initialise a new `Workspace` object.
+
+        :param dict packages: Map of package names to tuples of version file,
+            file type, output filename and file type pairs, and dependencies
+        :raise ValueError: Unknown dependency
+
+        """
+        self.packages = packages
+        self.dependents = dict((name, []) for name in packages)
+        for name, (_, _, _, depends) in sorted(packages.items()):
+            for dependency in depends:
+                if dependency not in packages:
+                    raise ValueError("Unknown dependency %r for package %r"
+                                     % (dependency, name))
+                self.dependents[dependency].append(name)
+
+    @classmethod
+    def read(cls, filename):
+        """Read a workspace manifest.
+
+        :param str filename: Manifest to read
+        :rtype: `Workspace`
+        :return: Workspace described by ``filename``
+        :raise IOError: When ``filename`` doesn't exist
+        :raise ValueError: Invalid manifest
+
+        """
+        parser = configparser.RawConfigParser()
+        try:
+            if not parser.read(filename):
+                raise IOError(errno.ENOENT, "Workspace %r not found"
+                              % filename)
+        except configparser.Error as error:
+            raise ValueError("Invalid workspace %r: %s" % (filename, error))
+        base = os.path.dirname(filename)
+        packages = {}
+        for name in parser.sections():
+            if not re.match("%s$" % VALID_PACKAGE, name):
+                raise ValueError("Invalid package name string %r" % name)
+            options = dict(parser.items(name))
+            if "file" not in options:
+                raise ValueError("No version file for package %r" % name)
+            path = os.path.join(base, options["file"])
+            file_type = options.get("type") or guess_type(path)
+            if not is_filetype(file_type):
+                raise ValueError("Invalid file type %r for package %r"
+                                 % (file_type, name))
+            outputs = [parse_output(os.path.join(base, s))
+                       for s in options.get("outputs", "").split()]
+            packages[name] = (path, file_type, outputs,
+                              options.get("depends", "").split())
+        return cls(packages)
+
+    def cascade(self, names):
+        """Find packages affected by changes to packages.
+
+        :param list names: Changed packages
+        :rtype: `set` of `str`
+        :return: ``names``, and every package depending on them
+        :raise ValueError: Unknown package
+
+        """
+        found = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name not in self.packages:
+                raise ValueError("Unknown package %r" % name)
+            if name not in found:
+                found.add(name)
+                pending.extend(self.dependents[name])
+        return found
+
+    def waves(self, names):
+        """Group packages in to dependency order.
+
+        Packages in each wave only depend on packages in earlier waves, so
+        the packages within a wave can be processed in parallel.
+
+        :param set names: Packages to order
+        :rtype: `list` of `list` of `str`
+        :return: Waves of package names
+        :raise ValueError: Dependency cycle
+
+        """
+        remaining = set(names)
+        waves = []
+        while remaining:
+            wave = sorted(name for name in remaining
+                          if not remaining.intersection(
+                              self.packages[name][3]))
+            if not wave:
+                raise ValueError("Dependency cycle between %s"
+                                 % ", ".join(sorted(remaining)))
+            waves.append(wave)
+            remaining.difference_update(wave)
+        return waves
+
+    def bump(self, names, bump_type, threads=None, history=None,
+             journal="versionah.journal"):
+        """Bump packages, and cascade bumps to their dependents.
+
+        Dependents have their least significant component bumped, see
+        `CASCADE_BUMPS`.  Every bump is checked before any file is changed,
+        and the version files are then updated as a single transaction with
+        :func:`update_files`.  Outputs are written once the transaction is
+        complete.
+
+        :param list names: Packages to bump
+        :param str bump_type: Component to bump
+        :param int threads: Number of threads, defaults to CPU count
+        :param History history: History store to record changes in
+        :param str journal: Journal file for the transaction
+        :rtype: `list` of `tuple`
+        :return: Package names and new versions, in dependency order, see
+            `Workspace.waves`
+        :raise IOError: Unreadable version file, or unfinished transaction
+        :raise ValueError: Unknown package, dependency cycle, unparsable
+            version file or invalid bump
+
+        """
+        order = [name for wave in self.waves(self.cascade(names))
+                 for name in wave]
+        files = []
+        for name in order:
+            filename, file_type = self.packages[name][:2]
+            version = Version.read(filename, file_type)
+            if name in names:
+                package_bump = bump_type
+            else:
+                package_bump = CASCADE_BUMPS[len(version.components)]
+            version.bump(package_bump)
+            files.append((filename, file_type, package_bump))
+        versions = update_files(files, journal, threads=threads,
+                                history=history)
+        for name, version in zip(order, versions):
+            for output, output_type in self.packages[name][2]:
+                version.write(output, output_type)
+        return list(zip(order, versions))
+
+
+def recover(journal, direction="forward"):
+    """Complete or revert an interrupted transaction.
+
+    :param str journal: Journal file of interrupted transaction
+    :param str direction: ``forward`` to complete the transaction, or
+        ``back`` to restore the original files
+    :rtype: `list` of `str`
+    :return: Recovered filenames
+
+    """
+    entries = _read_journal(journal)
+    for target, staged, backup, in_place in entries:
+        if direction == "forward":
+            if os.path.exists(staged):
+                _move_file(staged, target, in_place)
+        elif backup:
+            _move_file(backup, target, in_place)
+        elif not os.path.exists(staged) and os.path.exists(target):
+            # Target was created by the transaction
+            os.remove(target)
+    _finish_transaction(journal, entries)
+    return [entry[0] for entry in entries]
+
+
+#: Block size used when copying files with resized spans
+PATCH_BLOCK = 1 << 16
+
+_MAGIC_BYTES = re.compile((r"This is (%s),? [vV]ersion (%s) \((%s)\)"
+                           % (VALID_PACKAGE, VALID_VERSION,
+                              VALID_DATE)).encode("ascii"))
+
+
+def compile_anchor(pattern):
+    """Compile an anchor for locating version spans.
+
+    If the pattern contains a group, the first group is the version span.
+    Otherwise the whole match is.
+
+    :param str pattern: Regular expression to compile
+    :rtype: ``re.RegexObject``
+    :return: Compiled expression, for use on file content
+    :raise ValueError: Invalid regular expression
+
+    """
+    try:
+        return re.compile(pattern.encode("utf-8"), re.MULTILINE)
+    except re.error:
+        raise ValueError("Invalid anchor %r" % pattern)
+
+
+def find_spans(data, anchors=()):
+    """Locate version spans in file content.
+
+    Spans are found in magic lines, and by any ``anchors``.  Spans
+    overlapping an earlier span are ignored.
+
+    :param data: File content to search, such as a `mmap.mmap` object
+    :param list anchors: Expressions from `compile_anchor`
+    :rtype: `tuple` of `Version` and `list`
+    :return: Version from the first span, or `None` if there are no spans,
+        and ``(start, end, field)`` tuples
+    :raise ValueError: Invalid version in anchored span
+
+    """
+    version = None
+    spans = []
+    for match in _MAGIC_BYTES.finditer(data):
+        if version is None:
+            name, version_str, date_str = [s.decode("ascii")
+                                           for s in match.groups()]
+            version = Version(version_str, name, parse_date(date_str))
+        spans.extend([(match.start(1), match.end(1), "name"),
+                      (match.start(2), match.end(2), "dotted"),
+                      (match.start(3), match.end(3), "date")])
+    for anchor in anchors:
+        group = 1 if anchor.groups else 0
+        for match in anchor.finditer(data):
+            if version is None:
+                version = Version(match.group(group).decode("ascii"))
+            spans.append((match.start(group), match.end(group), "dotted"))
+    spans.sort()
+    found = []
+    for span in spans:
+        if not found or span[0] >= found[-1][1]:
+            found.append(span)
+    return version, found
+
+
+def _copy_range(data, output, start, end):
+    """Copy part of a file's content in blocks.
+
+    :param data: File content to copy from
+    :param file output: File to write to
+    :param int start: Offset to begin copying at
+    :param int end: Offset to end copying at
+
+    """
+    for offset in range(start, end, PATCH_BLOCK):
+        output.write(data[offset:min(offset + PATCH_BLOCK, end)])
+
+
+def patch_file(filename, anchors=(), bump_type=None, components=None,
+               name=None, expect=None, history=None):
+    """Update version spans in an existing file.
+
+    Only the spans are rewritten, in place if their lengths are unchanged.
+    Otherwise the file is copied to a temporary file with the new spans, and
+    renamed over the original following the rules of `_replace_file`.
+
+    :param str filename: File to patch
+    :param list anchors: Expressions from `compile_anchor`
+    :param str bump_type: Component to bump, if any
+    :type components: `str` or `tuple` of `int`
+    :param components: Components to set, if not bumping
+    :param str name: New package name, if any
+    :param str expect: Version the file must contain before it is changed
+    :param History history: History store to record changes in
+    :rtype: `Version`
+    :return: Version written to file
+    :raise OSError: When ``filename`` doesn't exist
+    :raise IOError: File doesn't contain ``expect``, with ``errno.EAGAIN``
+    :raise ValueError: No version spans in file
+
+    """
+    source = open(filename, "rb")
+    try:
+        try:
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (mmap.error, ValueError):
+            raise ValueError("No version span found in %r" % filename)
+        try:
+            version, spans = find_spans(data, anchors)
+            if version is None:
+                raise ValueError("No version span found in %r" % filename)
+            if expect and not version == expect:
+                raise IOError(errno.EAGAIN,
+                              "Version changed, expected %s but found %s"
+                              % (expect, version.as_dotted()))
+            old = Version.from_key(version.key, version.name, version.date)
+            if name:
+                version.name = name
+            if bump_type:
+                version.bump(bump_type)
+            elif components:
+                version.set(components)
+            values = {"name": version.name, "dotted": version.as_dotted(),
+                      "date": version.as_date()}
+            patches = []
+            for start, end, field in spans:
+                value = values[field].encode("utf-8")
+                if not data[start:end] == value:
+                    patches.append((start, end, value))
+            if all(len(value) == end - start
+                   for start, end, value in patches):
+                _patch_in_place(filename, patches)
+            else:
+                _patch_copy(filename, data, patches)
+        finally:
+            data.close()
+    finally:
+        source.close()
+    if history and (bump_type or components):
+        history.record("bump" if bump_type else "set", filename, old, version)
+    return version
+
+
+def _patch_in_place(filename, patches):
+    """Overwrite spans without changing a file's length.
+
+    :param str filename: File to patch
+    :param list patches: ``(start, end, value)`` tuples
+
+    """
+    if not patches:
+        return
+    output = open(filename, "r+b")
+    try:
+        for start, _, value in patches:
+            output.seek(start)
+            output.write(value)
+        output.flush()
+        os.fsync(output.fileno())
+    finally:
+        output.close()
+
+
+def _patch_copy(filename, data, patches):
+    """Write a patched copy of a file, and replace the original with it.
+
+    :param str filename: File to patch
+    :param data: Original content of ``filename``
+    :param list patches: ``(start, end, value)`` tuples
+
+    """
+    filename = os.path.realpath(filename)
+    in_place = _rewrite_in_place(os.stat(filename))
+    handle, temp = tempfile.mkstemp(prefix=".versionah-",
+                                    dir=os.path.dirname(filename))
+    output = os.fdopen(handle, "wb")
+    try:
+        offset = 0
+        for start, end, value in patches:
+            _copy_range(data, output, offset, start)
+            output.write(value)
+            offset = end
+        _copy_range(data, output, offset, len(data))
+        output.flush()
+        os.fsync(output.fileno())
+        output.close()
+        shutil.copymode(filename, temp)
+        _move_file(temp, filename, in_place)
+    finally:
+        output.close()
+        if os.path.exists(temp):
+            os.unlink(temp)
+
+
+def sort_key(string, reverse=False):
+    """Generate a sort key for a version.
+
+    Components are padded, so that 0.1 and 0.1.0 sort as equals in the same
+    way as `Version` comparisons.  Pre-releases sort by SemVer precedence,
+    see `precedence_key`.
+
+    :type string: `str`, `Version` or `FrozenVersion`
+    :param string: Version to generate key for
+    :param bool reverse: Generate key for descending order
+    :rtype: `tuple`
+    :return: Key for version
     :raise ValueError: Invalid version string
 
     """
-    if not re.match("%s$" % VALID_VERSION, version):
-        raise ValueError("Invalid version string %r" % version)
+    if isinstance(string, (Version, FrozenVersion)) and not reverse:
+        return string.precedence
+    elif isinstance(string, (Version, FrozenVersion)):
+        components, prerelease = string.components_full, string.prerelease
+    else:
+        components, prerelease, _ = split_version(string, True)
+        components = (components + (0, 0, 0))[:4]
+    return precedence_key(components, prerelease, reverse)
+
+
+def _write_run(directory, keyed):
+    """Write a sorted run to a temporary file.
+
+    :param str directory: Directory to create run in
+    :param keyed: Sorted key and line pairs
+    :type keyed: iterable of `tuple`
+    :rtype: `str`
+    :return: Filename of run
+
+    """
+    handle, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    run = os.fdopen(handle, "w")
+    try:
+        run.writelines(line + "\n" for _, line in keyed)
+    finally:
+        run.close()
+    return path
+
+
+def _sort_run(args):
+    """Sort a chunk of version strings to a run file.
+
+    :param tuple args: Lines to sort, reverse flag and run directory
+    :rtype: `str`
+    :return: Filename of run
+
+    """
+    lines, reverse, directory = args
+    return _write_run(directory,
+                      sorted((sort_key(line, reverse), line)
+                             for line in lines))
+
+
+def _read_run(path, reverse):
+    """Generate key and line pairs from a run file.
+
+    :param str path: Run file to read
+    :param bool reverse: Run was sorted in descending order
+    :rtype: generator of `tuple`
+
+    """
+    for line in open(path):
+        line = line.rstrip("\n")
+        yield sort_key(line, reverse), line
+
+
+def _chunks(streams, size):
+    """Split version strings from streams in to chunks.
+
+    :param list streams: File objects to read
+    :param int size: Maximum lines per chunk
+    :rtype: generator of `list` of `str`
+
+    """
+    chunk = []
+    for stream in streams:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(line)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def sort_versions(streams, output, unique=False, reverse=False,
+                  chunk_lines=100000, processes=None, fan_in=128):
+    """Sort version strings that may not fit in memory.
+
+    Input is split in to chunks of ``chunk_lines``, which are sorted in
+    parallel to temporary run files and then merged.
+
+    :param list streams: File objects to read version strings from
+    :param file output: Stream to write sorted versions to
+    :param bool unique: Only output the first of each equal version
+    :param bool reverse: Sort in descending order
+    :param int chunk_lines: Number of lines to sort in memory at once
+    :param int processes: Number of sorting processes, defaults to CPU count
+    :param int fan_in: Maximum number of runs to merge at once
+    :raise ValueError: Invalid version string
+
+    """
+    if processes is None:
+        processes = cpu_count()
+    directory = tempfile.mkdtemp(prefix="versionah-")
+    try:
+        runs = []
+        chunks = ((chunk, reverse, directory)
+                  for chunk in _chunks(streams, chunk_lines))
+        if processes == 1:
+            runs = [_sort_run(args) for args in chunks]
+        else:
+            pool = Pool(processes)
+            try:
+                pending = []
+                for args in chunks:
+                    pending.append(pool.apply_async(_sort_run, (args, )))
+                    # Limit the number of chunks held in memory
+                    if len(pending) >= processes * 2:
+                        runs.append(pending.pop(0).get())
+                runs.extend(result.get() for result in pending)
+            finally:
+                pool.terminate()
+
+        while len(runs) > fan_in:
+            merged = heapq.merge(*[_read_run(path, reverse)
+                                   for path in runs[:fan_in]])
+            runs = runs[fan_in:] + [_write_run(directory, merged), ]
+
+        previous = None
+        lines = []
+        for key, line in heapq.merge(*[_read_run(path, reverse)
+                                       for path in runs]):
+            if unique and key == previous:
+                continue
+            previous = key
+            lines.append(line)
+            if len(lines) >= 1024:
+                output.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            output.write("\n".join(lines) + "\n")
+    finally:
+        shutil.rmtree(directory)
+
+
+class InventoryStats(object):
+
+    """Aggregate statistics for package version records.
+
+    Memory use depends on the number of distinct packages, not the number of
+    records.  Separately gathered statistics can be combined with
+    `InventoryStats.merge`.
+
+    """
+
+    def __init__(self):
+        """Initialise a new `InventoryStats` object."""
+        #: Map of package name to record count, and oldest and latest
+        #: version keys and strings
+        self.packages = {}
+        #: Record counts by major version
+        self.majors = {}
+        #: Record counts by major and minor version
+        self.minors = {}
+        self.records = 0
+        self.invalid = 0
+
+    def add(self, name, version):
+        """Add a record.
+
+        :param str name: Package name
+        :param str version: Version string
+        :raise ValueError: Invalid version string
+
+        """
+        key = sort_key(version)
+        self.records += 1
+        self.majors[key[0]] = self.majors.get(key[0], 0) + 1
+        self.minors[key[:2]] = self.minors.get(key[:2], 0) + 1
+        package = self.packages.get(name)
+        if package is None:
+            self.packages[name] = [1, key, version, key, version]
+            return
+        package[0] += 1
+        if key < package[1]:
+            package[1:3] = key, version
+        if key > package[3]:
+            package[3:5] = key, version
+
+    def add_lines(self, lines):
+        """Add ``name version`` records.
+
+        Any further fields on a line are ignored.
+
+        :param lines: Records to add
+        :type lines: iterable of `str`
+
+        """
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                self.add(fields[0], fields[1])
+            except (IndexError, ValueError):
+                self.invalid += 1
+
+    def merge(self, other):
+        """Combine statistics from another object.
+
+        :param InventoryStats other: Statistics to merge
+
+        """
+        self.records += other.records
+        self.invalid += other.invalid
+        for counts, new in ((self.majors, other.majors),
+                            (self.minors, other.minors)):
+            for key, count in new.items():
+                counts[key] = counts.get(key, 0) + count
+        for name, data in other.packages.items():
+            package = self.packages.get(name)
+            if package is None:
+                self.packages[name] = list(data)
+                continue
+            package[0] += data[0]
+            if data[1] < package[1]:
+                package[1:3] = data[1:3]
+            if data[3] > package[3]:
+                package[3:5] = data[3:5]
+
+    def lagging(self, threshold):
+        """Find packages whose latest version is older than ``threshold``.
+
+        :param str threshold: Version string
+        :rtype: `list` of `str`
+        :return: Sorted package names
+
+        """
+        key = sort_key(threshold)
+        return sorted(name for name, data in self.packages.items()
+                      if data[3] < key)
+
+    def report(self, output, threshold=None):
+        """Write a text report.
+
+        :param file output: Stream to write report to
+        :param str threshold: Version to report lagging packages against
+
+        """
+        output.write("Records: %d, packages: %d, invalid: %d\n"
+                     % (self.records, len(self.packages), self.invalid))
+        output.write("Packages:\n")
+        for name in sorted(self.packages):
+            count, _, oldest, _, latest = self.packages[name]
+            output.write("  %s: %d records, oldest %s, latest %s\n"
+                         % (name, count, oldest, latest))
+        output.write("Major versions:\n")
+        for major in sorted(self.majors):
+            output.write("  %d: %d\n" % (major, self.majors[major]))
+        output.write("Minor versions:\n")
+        for minor in sorted(self.minors):
+            output.write("  %d.%d: %d\n" % (minor + (self.minors[minor], )))
+        if threshold:
+            output.write("Lagging behind %s:\n" % threshold)
+            for name in self.lagging(threshold):
+                output.write("  %s: %s\n" % (name, self.packages[name][4]))
+
+
+def _batch_stats(lines):
+    """Gather statistics for a batch of records.
+
+    :param list lines: Records to process
+    :rtype: `InventoryStats`
+
+    """
+    stats = InventoryStats()
+    stats.add_lines(lines)
+    return stats
+
+
+def inventory_stats(streams, processes=None, batch_lines=50000):
+    """Gather statistics for streams of ``name version`` records.
+
+    :param list streams: File objects to read records from
+    :param int processes: Number of worker processes, defaults to CPU count
+    :param int batch_lines: Number of records to send to a worker at once
+    :rtype: `InventoryStats`
+
+    """
+    if processes is None:
+        processes = cpu_count()
+    stats = InventoryStats()
+    if processes == 1:
+        for stream in streams:
+            stats.add_lines(stream)
+        return stats
+    pool = Pool(processes)
+    try:
+        pending = []
+        for batch in _chunks(streams, batch_lines):
+            pending.append(pool.apply_async(_batch_stats, (batch, )))
+            # Limit the number of batches held in memory
+            if len(pending) >= processes * 2:
+                stats.merge(pending.pop(0).get())
+        for result in pending:
+            stats.merge(result.get())
+    finally:
+        pool.terminate()
+    return stats
+
+
+#: Loose magic line match, so invalid fields can be reported individually
+_LOOSE_MAGIC = re.compile(r"This is (\S+?),? [vV]ersion (\S+) \(([^)]*)\)")
+
+
+def check_file(filename, file_type=None):
+    """Validate a version file without modifying it.
+
+    The package name, version and date are read as in `Version.read`, and
+    must be valid.  The date must not be in the future, and the file must
+    match a fresh rendering of the version it contains.  Renderings depend
+    on the filename for some file types, so files should be checked using the
+    path they were written with.
+
+    :param str filename: Version file to check
+    :param str file_type: File type, guessed from the suffix if `None`
+    :rtype: `dict`
+    :return: Filename, file type, dotted version and a list of errors
+
+    """
+    if file_type is None:
+        file_type = guess_type(filename)
+    errors = []
+    result = {"file": filename, "type": file_type, "version": None,
+              "errors": errors}
+    try:
+        data = open(filename).read()
+    except IOError as error:
+        errors.append("Unable to read file: %s" % error.strerror)
+        return result
+    reader = READERS.get(file_type)
+    fields = reader(data) if reader else None
+    if not fields:
+        match = _LOOSE_MAGIC.search(data)
+        if not match:
+            errors.append("No version identifier found")
+            return result
+        fields = match.groups()
+    name, version_str, date_str = fields
+    if not re.match("%s$" % VALID_PACKAGE, name):
+        errors.append("Invalid package name string %r" % name)
+    if not re.match("%s$" % VALID_VERSION, version_str):
+        errors.append("Invalid version string %r" % version_str)
+    try:
+        date = parse_date(date_str)
+    except ValueError as error:
+        errors.append(error.args[0])
+    else:
+        if date > datetime.date.today():
+            errors.append("Date %s is in the future" % date_str)
+    if errors:
+        return result
+    components, prerelease, build = split_version(version_str, True)
+    version = Version.from_components_unchecked(components, name, date,
+                                                prerelease, build)
+    result["version"] = version.as_dotted()
+    try:
+        rendered = version.render(file_type, filename)
+    except (ValueError, jinja2.TemplateError) as error:
+        errors.append("Unable to render %s: %s" % (file_type, error))
+        return result
+    if rendered.strip() != data.strip():
+        errors.append("Content out of sync with %s"
+                      % version.display("web"))
+    return result
+
+
+def check_output(filename, file_type, source, source_type=None):
+    """Check an output file is in sync with its version file.
+
+    :param str filename: Output file to check
+    :param str file_type: Output file type
+    :param str source: Version file ``filename`` is generated from
+    :param str source_type: Version file type, guessed from the suffix if
+        `None`
+    :rtype: `dict`
+    :return: Filename, file type, dotted version, source and a list of errors
+
+    """
+    errors = []
+    result = {"file": filename, "type": file_type, "version": None,
+              "source": source, "errors": errors}
+    try:
+        version = Version.read(source, source_type)
+    except IOError as error:
+        errors.append("Unable to read source: %s" % error.strerror)
+        return result
+    except ValueError as error:
+        errors.append("Invalid source: %s" % error.args[0])
+        return result
+    result["version"] = version.as_dotted()
+    try:
+        data = open(filename).read()
+    except IOError as error:
+        errors.append("Unable to read file: %s" % error.strerror)
+        return result
+    try:
+        rendered = version.render(file_type, filename)
+    except (ValueError, jinja2.TemplateError) as error:
+        errors.append("Unable to render %s: %s" % (file_type, error))
+        return result
+    if rendered.strip() != data.strip():
+        errors.append("Output out of sync with %s" % source)
+    return result
+
+
+def _check_batch(batch):
+    """Check a batch of version and output files.
+
+    :param list batch: Filename, file type, source and source type tuples,
+        with a source of `None` for version files
+    :rtype: `list` of `dict`
+    :return: Results from `check_file` or `check_output`
+
+    """
+    return [check_file(filename, file_type) if source is None
+            else check_output(filename, file_type, source, source_type)
+            for filename, file_type, source, source_type in batch]
+
+
+def _check_jobs(jobs, processes=None, batch_files=64):
+    """Run file checks in parallel.
+
+    :param list jobs: Arguments for `_check_batch`
+    :param int processes: Number of worker processes, defaults to CPU count
+    :param int batch_files: Number of files to send to a worker at once
+    :rtype: `list` of `dict`
+    :return: Results in the order of ``jobs``
+
+    """
+    if processes is None:
+        processes = cpu_count()
+    if processes == 1 or len(jobs) <= batch_files:
+        return _check_batch(jobs)
+    pool = Pool(processes)
+    try:
+        pending = [pool.apply_async(_check_batch,
+                                    (jobs[i:i + batch_files], ))
+                   for i in range(0, len(jobs), batch_files)]
+        results = []
+        for result in pending:
+            results.extend(result.get())
+    finally:
+        pool.terminate()
+    return results
+
+
+def check_files(filenames, file_type=None, processes=None, batch_files=64):
+    """Validate version files in parallel, see `check_file`.
+
+    :param list filenames: Version files to check
+    :param str file_type: File type, guessed from each suffix if `None`
+    :param int processes: Number of worker processes, defaults to CPU count
+    :param int batch_files: Number of files to send to a worker at once
+    :rtype: `list` of `dict`
+    :return: Results in the order of ``filenames``
+
+    """
+    return _check_jobs([(filename, file_type, None, None)
+                        for filename in filenames], processes, batch_files)
+
+
+def check_workspace(workspace, processes=None, batch_files=64):
+    """Validate a workspace's version files and outputs in parallel.
+
+    Version files are checked with `check_file`, and each package's outputs
+    with `check_output`.
+
+    :param Workspace workspace: Workspace to check
+    :param int processes: Number of worker processes, defaults to CPU count
+    :param int batch_files: Number of files to send to a worker at once
+    :rtype: `list` of `dict`
+    :return: Results in package name order, with each version file followed
+        by its outputs
+
+    """
+    jobs = []
+    for name in sorted(workspace.packages):
+        filename, file_type, outputs = workspace.packages[name][:3]
+        jobs.append((filename, file_type, None, None))
+        jobs.extend((output, output_type, filename, file_type)
+                    for output, output_type in outputs)
+    return _check_jobs(jobs, processes, batch_files)
+
+
+class VersionRegistry(object):
+
+    """Read-only access to a binary version registry.
+
+    The file is memory mapped, so opening a registry is cheap regardless of
+    its size and records are only decoded when accessed.  Registries consist
+    of a `HEADER`, fixed width `RECORD` entries sorted by package name, and
+    a table of UTF-8 encoded package names.
+
+    """
+
+    #: File identifier
+    MAGIC = b"VAHR"
+    #: Format revision
+    FORMAT = 1
+    #: Magic, format, reserved, record count and string table offset
+    HEADER = struct.Struct("<4sHHII")
+    #: Components, resolution, days since epoch, name offset and length
+    RECORD = struct.Struct("<4IB3xiII")
+    EPOCH = datetime.date(1970, 1, 1)
+
+    def __init__(self, filename):
+        """Open a registry file.
+
+        :param str filename: Registry file to open
+        :raise ValueError: Invalid registry file
+
+        """
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            magic, fmt, _, self._count, self._strings = \
+                self.HEADER.unpack_from(self._map, 0)
+        except (mmap.error, struct.error, ValueError):
+            self._file.close()
+            raise ValueError("Invalid registry file %r" % filename)
+        records_end = self.HEADER.size + self._count * self.RECORD.size
+        if not magic == self.MAGIC or not fmt == self.FORMAT \
+                or not records_end <= self._strings <= len(self._map):
+            self.close()
+            raise ValueError("Invalid registry file %r" % filename)
+
+    def __len__(self):
+        """Number of records in registry.
+
+        :rtype: `int`
+
+        """
+        return self._count
+
+    def _record(self, index):
+        """Decode a raw record.
+
+        :param int index: Record number
+        :rtype: `tuple`
+
+        """
+        return self.RECORD.unpack_from(self._map, self.HEADER.size
+                                       + index * self.RECORD.size)
+
+    def _name(self, record):
+        """Fetch the encoded package name for a raw record.
+
+        :param tuple record: Record from `VersionRegistry._record`
+        :rtype: `bytes`
+
+        """
+        start = self._strings + record[6]
+        return self._map[start:start + record[7]]
+
+    def __getitem__(self, index):
+        """Fetch a record.
+
+        :param int index: Record number
+        :rtype: `Version`
+        :raise IndexError: Invalid record number
+
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Registry index out of range")
+        record = self._record(index)
+        date = self.EPOCH + datetime.timedelta(days=record[5])
+        return Version.from_key(record[:5],
+                                self._name(record).decode("utf-8"), date)
+
+    def find(self, name):
+        """Find all records for a package.
+
+        :param str name: Package name
+        :rtype: `list` of `Version`
+        :return: Records for package, in version order
+
+        """
+        encoded = name.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(self._record(middle)) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self._count \
+                and self._name(self._record(low)) == encoded:
+            found.append(self[low])
+            low += 1
+        return found
+
+    def close(self):
+        """Close registry file."""
+        self._map.close()
+        self._file.close()
 
-    return tuple(int(s) for s in version.split("."))
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def write(cls, filename, versions):
+        """Write a registry file.
+
+        Records only have space for numeric components, so pre-release and
+        build metadata can't be stored.
+
+        :param str filename: Registry file to write
+        :param versions: Versions to store
+        :type versions: iterable of `Version`
+        :raise ValueError: Version can't be stored in registry
+
+        """
+        entries = []
+        for version in versions:
+            if version.prerelease or version.build:
+                raise ValueError("Unable to store %s %s in registry"
+                                 % (version.name, version.as_dotted()))
+            entries.append((version.name.encode("utf-8"),
+                            version.components_full, version._resolution,
+                            (version.date - cls.EPOCH).days))
+        entries.sort()
+        offsets = {}
+        strings = []
+        size = 0
+        records = []
+        for name, components, resolution, days in entries:
+            if name not in offsets:
+                offsets[name] = size
+                strings.append(name)
+                size += len(name)
+            try:
+                records.append(cls.RECORD.pack(*(components
+                                                 + (resolution, days,
+                                                    offsets[name],
+                                                    len(name)))))
+            except struct.error:
+                raise ValueError("Unable to store %s %s in registry"
+                                 % (name.decode("utf-8"),
+                                    _dotted(components[:resolution])))
+        table = cls.HEADER.size + cls.RECORD.size * len(records)
+        output = open(filename, "wb")
+        try:
+            output.write(cls.HEADER.pack(cls.MAGIC, cls.FORMAT, 0,
+                                         len(records), table))
+            output.write(b"".join(records))
+            output.write(b"".join(strings))
+        finally:
+            output.close()
+
+    @classmethod
+    def build(cls, filename, sources):
+        """Write a registry file from versionah files.
+
+        :param str filename: Registry file to write
+        :param list sources: Version files to read
+
+        """
+        cls.write(filename, (Version.read(source) for source in sources))
 
 
 def process_command_line(argv=sys.argv[1:]):
@@ -516,10 +3796,12 @@ def process_command_line(argv=sys.argv[1:]):
                                    version="%prog v" + __version__,
                                    description=USAGE)
 
-    parser.set_defaults(file_type=None, bump=None, display_format="dotted")
+    parser.set_defaults(file_type=None, bump=None, display_format="dotted",
+                        outputs=[], anchors=[], invalid="report",
+                        journal="versionah.journal",
+                        history_file=os.environ.get("VERSIONAH_HISTORY"))
 
-    parser.add_option("-t", "--type", choices=Version.filetypes,
-                      dest="file_type", metavar="text",
+    parser.add_option("-t", "--type", dest="file_type", metavar="text",
                       help="define the file type used for version file")
     parser.add_option("-n", "--name", metavar="name",
                       help="package name for version")
@@ -529,57 +3811,158 @@ def process_command_line(argv=sys.argv[1:]):
                       choices=("major", "minor", "micro", "patch"),
                       metavar="micro",
                       help="bump type by one")
-    parser.add_option("-d", "--display", choices=Version.display_types(),
-                      dest="display_format", metavar="dotted",
+    parser.add_option("-e", "--expect", metavar="0.1.0",
+                      help="only modify file if it contains this version")
+    parser.add_option("-d", "--display", dest="display_format",
+                      metavar="dotted",
                       help="display output in format")
     parser.add_option("-l", "--list", action="store_true",
                       help="list supported displayed formats")
+    parser.add_option("--templates", action="store_true",
+                      help="list templates used for each file type")
+    parser.add_option("-o", "--output", action="append", dest="outputs",
+                      metavar="file:type",
+                      help="also generate file from version, may be repeated")
+    parser.add_option("-w", "--watch", action="store_true",
+                      help="regenerate outputs when version file changes")
+    parser.add_option("--stdin", action="store_true",
+                      help="reformat version records read from stdin")
+    parser.add_option("--invalid", choices=("report", "pass"),
+                      metavar="report",
+                      help="report or pass through invalid stdin records")
+    parser.add_option("-M", "--depfile", metavar="file",
+                      help="write make dependencies for generated files")
+    parser.add_option("--sort", action="store_true",
+                      help="sort files of version strings")
+    parser.add_option("-u", "--unique", action="store_true",
+                      help="only output the first of equal sorted versions")
+    parser.add_option("-r", "--reverse", action="store_true",
+                      help="sort in descending order")
+    parser.add_option("--stats", action="store_true",
+                      help="report statistics for name and version records")
+    parser.add_option("--lag", metavar="1.0.0",
+                      help="report packages older than version in stats")
+    parser.add_option("--cache-stats", action="store_true",
+                      help="report render cache statistics on exit")
+    parser.add_option("-j", "--jobs", type="int", metavar="4",
+                      help="number of worker processes")
+    parser.add_option("--build-registry", metavar="file",
+                      help="write binary registry from version files")
+    parser.add_option("--history-file", metavar="file",
+                      help="record version changes in history database")
+    parser.add_option("--history", metavar="query",
+                      help="show latest, a date's or a package's history")
+    parser.add_option("-x", "--transaction", action="store_true",
+                      help="atomically bump or set multiple version files")
+    parser.add_option("--journal", metavar="file",
+                      help="journal file for transactions")
+    parser.add_option("--recover", choices=("forward", "back"),
+                      metavar="forward",
+                      help="complete or revert an interrupted transaction")
+    parser.add_option("--check", action="store_true",
+                      help="validate version files, reporting as JSON")
+    parser.add_option("--workspace", metavar="file",
+                      help="bump packages in workspace, and their dependents")
+    parser.add_option("-p", "--patch", action="store_true",
+                      help="only rewrite version spans in an existing file")
+    parser.add_option("-a", "--anchor", action="append", dest="anchors",
+                      metavar="regexp",
+                      help="expression locating a version span to patch, "
+                           "may be repeated")
 
     options, args = parser.parse_args(argv)
+    options.files = args
 
-    if options.list:
+    if options.file_type and not is_filetype(options.file_type):
+        parser.error("Invalid file type %r" % options.file_type)
+    if options.jobs is not None and options.jobs < 1:
+        parser.error("Invalid number of jobs %r" % options.jobs)
+    if not hasattr(Version, "as_%s" % options.display_format):
+        try:
+            get_formatter(options.display_format)
+        except ValueError as error:
+            parser.error(error.args[0])
+
+    if options.list or options.templates or options.stdin or options.recover \
+            or options.sort or options.stats or options.history \
+            or options.check:
         file_name = None
+        if options.check:
+            if options.workspace and args:
+                parser.error("Workspace checks don't take files")
+            if not args and not options.workspace:
+                parser.error("One version file must be specified")
+            if options.bump or options.set or options.name \
+                    or options.outputs:
+                parser.error("Check mode doesn't modify files")
+        if options.history and not options.history_file:
+            parser.error("History queries require a history file")
+        if options.lag and not re.match("%s$" % VALID_VERSION, options.lag):
+            parser.error("Invalid version string for lag %r" % options.lag)
     else:
         if options.name and not re.match("%s$" % VALID_PACKAGE, options.name):
             parser.error("Invalid package name string %r" % options.name)
 
         if options.set and not re.match("%s$" % VALID_VERSION, options.set):
             parser.error("Invalid version string for set %r" % options.set)
-
-        if not args:
+        if options.expect and not re.match("%s$" % VALID_VERSION,
+                                           options.expect):
+            parser.error("Invalid version string for expect %r"
+                         % options.expect)
+
+        if options.workspace:
+            if not args:
+                parser.error("One package must be specified")
+            if not options.bump:
+                parser.error("Workspaces require a bump")
+            if options.expect:
+                parser.error("Workspaces can't check expected versions")
+        elif not args:
             parser.error("One version file must be specified")
+        elif options.transaction or options.build_registry:
+            if options.transaction and not options.bump \
+                    and not options.set:
+                parser.error("Transactions require a bump or set")
+            if options.transaction and (options.name or options.outputs):
+                parser.error("Transactions can't change names or write "
+                             "outputs")
+            options.files = [(s, options.file_type or guess_type(s))
+                             for s in args]
         elif not len(args) == 1:
             parser.error("Only one version file must be specified")
         file_name = args[0]
 
         if not options.file_type:
-            suffix = os.path.splitext(file_name)[1][1:]
-            if suffix in Version.filetypes:
-                options.file_type = suffix
-            else:
-                options.file_type = "text"
+            options.file_type = guess_type(file_name)
+
+        try:
+            options.outputs = [parse_output(s) for s in options.outputs]
+        except ValueError as error:
+            parser.error(error.args[0])
+        if options.watch and not options.outputs:
+            parser.error("Watch mode requires at least one output")
+
+        if options.anchors and not options.patch:
+            parser.error("Anchors require patch mode")
+        try:
+            options.anchors = [compile_anchor(s) for s in options.anchors]
+        except ValueError as error:
+            parser.error(error.args[0])
 
     return options, file_name
 
 
-def main(argv=sys.argv[:]):
-    """Main script entry point.
+def _update(filename, options):
+    """Read, and optionally modify, a version file.
 
+    :param str filename: Version file to process
+    :param optparse.Values options: Command line options
     :rtype: `int`
     :return: Exit code
 
     """
-
-    options, filename = process_command_line(argv[1:])
-
-    if options.list:
-        print(success("Supported display types:"))
-        for dtype in Version.display_types():
-            print("  *", dtype)
-        return
-
     try:
-        version = Version.read(filename)
+        version = Version.read(filename, options.file_type)
     except IOError:
         version = Version()
     except ValueError as error:
@@ -590,13 +3973,306 @@ def main(argv=sys.argv[:]):
         print(fail("File not found"))
         return errno.ENOENT
 
+    if options.expect and not version == options.expect:
+        print(fail("Version changed, expected %s but found %s"
+                   % (options.expect, version.as_dotted())))
+        return errno.EAGAIN
+
+    if os.path.exists(filename):
+        old = Version.from_key(version.key, version.name, version.date)
+    else:
+        old = None
+    written = []
     if options.name:
         version.name = options.name
     if options.bump:
         version.bump(options.bump)
         version.write(filename, options.file_type)
+        written.append((filename, options.file_type))
     elif options.set:
         version.set(options.set)
         version.write(filename, options.file_type)
+        written.append((filename, options.file_type))
+    if written and options.history_file:
+        history = History(options.history_file)
+        try:
+            history.record("bump" if options.bump else "set", filename, old,
+                           version)
+        finally:
+            history.close()
+    for output, file_type in options.outputs:
+        version.write(output, file_type)
+        written.append((output, file_type))
+
+    if options.depfile:
+        rules = []
+        for output, file_type in written:
+            dependencies = [Version.template_path(file_type), ]
+            # Templates from plugins have no file
+            if dependencies[0] is None:
+                dependencies = []
+            if not output == filename:
+                dependencies.append(filename)
+            rules.append((output, dependencies))
+        write_depfile(options.depfile, rules)
+
+    print(success(version.display(options.display_format)))
+
+
+def _patch(filename, options):
+    """Read, and optionally modify, version spans in a file.
+
+    :param str filename: File to process
+    :param optparse.Values options: Command line options
+    :rtype: `int`
+    :return: Exit code
 
+    """
+    if not os.path.exists(filename):
+        print(fail("File not found"))
+        return errno.ENOENT
+    if options.history_file:
+        history = History(options.history_file)
+    else:
+        history = None
+    try:
+        version = patch_file(filename, options.anchors, options.bump,
+                             options.set, options.name, options.expect,
+                             history)
+    except IOError as error:
+        if not error.errno == errno.EAGAIN:
+            raise
+        print(fail(error.strerror))
+        return errno.EAGAIN
+    except ValueError as error:
+        print(fail(error.args[0]))
+        return errno.EINVAL
+    finally:
+        if history:
+            history.close()
     print(success(version.display(options.display_format)))
+
+
+def _open_streams(filenames):
+    """Open files for reading records.
+
+    :param list filenames: Files to open
+    :rtype: `list` of `file`
+    :return: Open files, or standard input if ``filenames`` is empty
+    :raise IOError: A file can't be opened, any opened files are closed
+
+    """
+    streams = []
+    try:
+        for filename in filenames:
+            streams.append(open(filename))
+    except IOError:
+        _close_streams(streams)
+        raise
+    return streams or [sys.stdin, ]
+
+
+def _close_streams(streams):
+    """Close files opened by `_open_streams`.
+
+    :param list streams: Files to close
+
+    """
+    for stream in streams:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def main(argv=sys.argv[:]):
+    """Main script entry point.
+
+    :rtype: `int`
+    :return: Exit code
+
+    """
+
+    options, filename = process_command_line(argv[1:])
+    try:
+        return _run(options, filename)
+    finally:
+        if options.cache_stats and Version.render_cache:
+            print("Render cache: %s" % Version.render_cache.report(),
+                  file=sys.stderr)
+
+
+def _run(options, filename):
+    """Run the mode selected on the command line.
+
+    :param optparse.Values options: Command line options
+    :param str filename: Version file to process
+    :rtype: `int`
+    :return: Exit code
+
+    """
+    if options.list:
+        print(success("Supported display types:"))
+        for dtype in Version.display_types():
+            print("  *", dtype)
+        return
+    if options.templates:
+        print(success("Templates by file type:"))
+        file_types = set(Version.filetypes)
+        file_types.update(_entry_points(FILETYPE_ENTRY_POINT))
+        for file_type in sorted(file_types):
+            print("  * %s: %s" % (file_type, Version.template_path(file_type)))
+        return
+    if options.stdin:
+        if filter_stream(sys.stdin, sys.stdout, options.display_format,
+                         options.invalid) and options.invalid == "report":
+            return errno.EINVAL
+        return
+    if options.sort:
+        try:
+            streams = _open_streams(options.files)
+        except IOError as error:
+            print(fail("Unable to open %r: %s" % (error.filename,
+                                                   error.strerror)))
+            return errno.ENOENT
+        try:
+            sort_versions(streams, sys.stdout, options.unique,
+                          options.reverse, processes=options.jobs)
+        except ValueError as error:
+            print(fail(error.args[0]))
+            return errno.EINVAL
+        finally:
+            _close_streams(streams)
+        return
+    if options.stats:
+        try:
+            streams = _open_streams(options.files)
+        except IOError as error:
+            print(fail("Unable to open %r: %s" % (error.filename,
+                                                   error.strerror)))
+            return errno.ENOENT
+        try:
+            inventory_stats(streams, options.jobs).report(sys.stdout,
+                                                          options.lag)
+        finally:
+            _close_streams(streams)
+        return
+    if options.check:
+        if options.workspace:
+            try:
+                workspace = Workspace.read(options.workspace)
+            except (IOError, ValueError) as error:
+                print(fail(str(error)))
+                return errno.EINVAL
+            results = check_workspace(workspace, options.jobs)
+        else:
+            results = check_files(options.files, options.file_type,
+                                  options.jobs)
+        failed = len([result for result in results if result["errors"]])
+        print(json.dumps({"checked": len(results), "failed": failed,
+                          "files": results}, sort_keys=True))
+        if failed:
+            return errno.EINVAL
+        return
+    if options.recover:
+        try:
+            files = recover(options.journal, options.recover)
+        except IOError as error:
+            print(fail(str(error)))
+            return errno.ENOENT
+        except ValueError as error:
+            print(fail(error.args[0]))
+            return errno.EINVAL
+        print(success("Recovered %s" % ", ".join(files)))
+        return
+    if options.history:
+        history = History(options.history_file)
+        try:
+            if options.history == "latest":
+                events = history.latest()
+            elif re.match("%s$" % VALID_DATE, options.history):
+                events = history.on_date(parse_date(options.history))
+            else:
+                events = history.package(options.history)
+        except ValueError as error:
+            print(fail(error.args[0]))
+            return errno.EINVAL
+        finally:
+            history.close()
+        for package, action, old, new, date, path in events:
+            print("%s %s %s %s -> %s %s" % (date, package, action, old or "-",
+                                            new, path))
+        return
+    if options.build_registry:
+        try:
+            VersionRegistry.build(options.build_registry,
+                                  [f[0] for f in options.files])
+        except (IOError, ValueError) as error:
+            print(fail(str(error)))
+            return errno.EINVAL
+        print(success("Wrote %d records to %s"
+                      % (len(options.files), options.build_registry)))
+        return
+    if options.transaction:
+        if options.history_file:
+            history = History(options.history_file)
+        else:
+            history = None
+        try:
+            versions = update_files(options.files, options.journal,
+                                    options.bump, options.set,
+                                    history=history, expect=options.expect)
+        except IOError as error:
+            if error.errno == errno.EAGAIN:
+                print(fail(error.strerror))
+                return errno.EAGAIN
+            print(fail(str(error)))
+            return errno.EIO
+        except ValueError as error:
+            print(fail(str(error)))
+            return errno.EIO
+        finally:
+            if history:
+                history.close()
+        for (filename, _), version in zip(options.files, versions):
+            display = version.display(options.display_format)
+            print(success("%s: %s" % (filename, display)))
+        return
+
+    if options.workspace:
+        if options.history_file:
+            history = History(options.history_file)
+        else:
+            history = None
+        try:
+            bumped = Workspace.read(options.workspace).bump(
+                options.files, options.bump, options.jobs, history,
+                options.journal)
+        except (IOError, ValueError) as error:
+            print(fail(str(error)))
+            return errno.EINVAL
+        finally:
+            if history:
+                history.close()
+        for name, version in bumped:
+            display = version.display(options.display_format)
+            print(success("%s: %s" % (name, display)))
+        return
+
+    if options.watch:
+        if not os.path.exists(filename):
+            print(fail("File not found"))
+            return errno.ENOENT
+        try:
+            watch(filename, options.outputs)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    lock = FileLock(filename)
+    if options.bump or options.set:
+        lock.acquire()
+    try:
+        if options.patch:
+            return _patch(filename, options)
+        return _update(filename, options)
+    finally:
+        lock.release()